@@ -0,0 +1,273 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import numpy as np
+from connect4 import connect4
+from players import alphaBetaAI, minimaxAI, randomAI
+from montecarlo import monteCarloAI
+from gamestate import GameState
+from bitboard import connected
+from rollout import batchRollouts, randomGame
+
+'''
+Benchmarks for the engine's hot paths.
+
+Every benchmark runs on the same fixed set of positions (random games from a fixed
+seed) and reports a rate, higher is better. Each one is timed -repeat times and the
+median is reported, with the output written as JSON with sorted keys so runs can be
+diffed and saved as a baseline:
+
+	python bench.py -out ../bench_output.txt
+	python bench.py -baseline ../bench_output.txt -tolerance 0.15
+
+Comparing against a baseline prints the change of every benchmark and exits with
+status 1 if any of them got slower by more than the tolerance.
+'''
+
+VERSION = 1
+SHAPE = (6,7)
+
+def benchPositions(count=8, seed=170):
+	'''
+	count positions from seeded random games, spread between 6 and 20 pieces, none of them over.
+	Returns (GameState, moves played) pairs.
+	'''
+	rng = random.Random(seed)
+	positions = []
+	while len(positions) < count:
+		target = 6 + (len(positions) * 14) // max(count - 1, 1)
+		state = GameState(SHAPE, (0, 0), (0,) * SHAPE[1], 1, 0)
+		moves = []
+		while state.ply < target:
+			column = rng.choice(state.legalMoves())
+			after = state.play(column)
+			if connected(after.boards[state.turn-1], SHAPE[0]+1):
+				break
+			state = after
+			moves.append(column)
+		if state.ply == target:
+			positions.append((state, moves))
+	return positions
+
+def gamePosition(moves, backend):
+	'''
+	connect4 game (with dummy players) that has had moves played
+	'''
+	c4 = connect4(randomAI(1), randomAI(2), board_shape=SHAPE, backend=backend)
+	for i, column in enumerate(moves):
+		c4.apply_move(column, 1 + i % 2)
+	c4.moveStack = []
+	return c4
+
+def timed(func, *args):
+	'''
+	(result, seconds) of one call
+	'''
+	start = time.perf_counter()
+	result = func(*args)
+	return result, time.perf_counter() - start
+
+def benchGameOver(positions, backend, calls=2000):
+	games = [(gamePosition(moves, backend), moves[-1], 1 + (len(moves)-1) % 2) for _, moves in positions]
+	def run():
+		for c4, column, player in games:
+			for _ in range(calls):
+				c4.gameOver(column, player)
+		return calls * len(games)
+	return run
+
+def benchGetEnv(positions, calls=50):
+	games = [gamePosition(moves, 'numpy') for _, moves in positions]
+	def run():
+		for c4 in games:
+			for _ in range(calls):
+				c4.getEnv()
+		return calls * len(games)
+	return run
+
+def benchGetState(positions, calls=2000):
+	games = [gamePosition(moves, 'bitboard') for _, moves in positions]
+	def run():
+		for c4 in games:
+			for _ in range(calls):
+				c4.getState()
+		return calls * len(games)
+	return run
+
+def benchEvaluation(positions, incremental, calls=500):
+	player = alphaBetaAI(1)
+	boards = []
+	for state, _ in positions:
+		b = state.toBitboard()
+		if incremental:
+			b.attachEvaluator()
+		boards.append(b)
+	def run():
+		for b in boards:
+			for _ in range(calls):
+				player.evaluationFunction(b)
+		return calls * len(boards)
+	return run
+
+def benchSortColumns(positions, calls=2000):
+	player = alphaBetaAI(1)
+	boards = [state.toBitboard() for state, _ in positions]
+	def run():
+		for b in boards:
+			for _ in range(calls):
+				player.sortColumnsByValue(b)
+		return calls * len(boards)
+	return run
+
+def benchBatchRollouts(positions, games=2000):
+	def run():
+		rng = np.random.default_rng(0)
+		for state, _ in positions:
+			batchRollouts(state, state.turn, games, rng)
+		return games * len(positions)
+	return run
+
+def benchRandomGames(positions, games=100):
+	def run():
+		rng = random.Random(0)
+		for state, _ in positions:
+			for _ in range(games):
+				randomGame(list(state.boards), list(state.heights), state.turn, state.shape, rng)
+		return games * len(positions)
+	return run
+
+def benchAlphaBeta(positions, depth=4, search='alphabeta'):
+	'''
+	Nodes per second of a fixed-depth search from every position, each with a fresh player
+	'''
+	def run():
+		nodes = 0
+		for state, _ in positions:
+			player = alphaBetaAI(state.turn, search=search)
+			env = state.toBitboard()
+			env.attachEvaluator()
+			if search == 'pvs':
+				player.searchRootWindow(env, depth, player.sortColumnsByValue(env), -np.inf, np.inf)
+			else:
+				player.searchRoot(env, depth, player.sortColumnsByValue(env), {})
+			nodes += player.nodes
+		return nodes
+	return run
+
+def benchMinimax(positions, depth=3):
+	'''
+	Nodes per second of minimaxAI's unpruned search from every position
+	'''
+	def run():
+		nodes = 0
+		for state, _ in positions:
+			player = minimaxAI(state.turn)
+			env = state.toBitboard()
+			env.attachEvaluator()
+			player.searchRoot(env, depth, player.orderColumns(env, -1, state.turn), {})
+			nodes += player.nodes
+		return nodes
+	return run
+
+def benchGames(players, games=4):
+	'''
+	Whole games per second with no time limits, seeded so every run plays the same games
+	'''
+	def run():
+		for seed in range(games):
+			p1, p2 = players
+			c4 = connect4(p1(1, seed), p2(2, seed), board_shape=SHAPE, backend='bitboard')
+			c4.play()
+		return games
+	return run
+
+def monteCarloFlat(position, seed):
+	return monteCarloAI(position, seed, mode='flat')
+
+benchmarks = {
+	'gameOver_numpy': ('calls/s', lambda p: benchGameOver(p, 'numpy')),
+	'gameOver_bitboard': ('calls/s', lambda p: benchGameOver(p, 'bitboard')),
+	'getEnv': ('calls/s', benchGetEnv),
+	'getState': ('calls/s', benchGetState),
+	'evaluationFunction': ('calls/s', lambda p: benchEvaluation(p, False)),
+	'evaluationFunction_incremental': ('calls/s', lambda p: benchEvaluation(p, True)),
+	'sortColumnsByValue': ('calls/s', benchSortColumns),
+	'rollouts_batch': ('games/s', benchBatchRollouts),
+	'rollouts_single': ('games/s', benchRandomGames),
+	'alphaBeta_nodes': ('nodes/s', benchAlphaBeta),
+	'minimax_nodes': ('nodes/s', benchMinimax),
+	'alphaBeta_pvs_nodes': ('nodes/s', lambda p: benchAlphaBeta(p, search='pvs')),
+	'games_alphaBeta_random': ('games/s', lambda p: benchGames((alphaBetaAI, randomAI))),
+	'games_alphaBeta_monteCarlo': ('games/s', lambda p: benchGames((alphaBetaAI, monteCarloFlat), games=1)),
+	}
+
+def runBenchmarks(names=None, repeat=5, progress=None):
+	'''
+	Run the benchmarks (all of them if names is None) and return the JSON report as a dict
+	'''
+	positions = benchPositions()
+	results = {}
+	for name, (unit, make) in benchmarks.items():
+		if names is not None and name not in names:
+			continue
+		run = make(positions)
+		run() # warm up caches (lru_caches, table allocation) outside the timed runs
+		rates = []
+		for _ in range(repeat):
+			ops, seconds = timed(run)
+			rates.append(ops / seconds)
+		results[name] = {'unit': unit, 'value': round(statistics.median(rates), 3), 'min': round(min(rates), 3), 'max': round(max(rates), 3)}
+		if progress is not None:
+			progress(f"{name}: {results[name]['value']:.1f} {unit}")
+	return {
+		'version': VERSION,
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'repeat': repeat,
+		'benchmarks': results}
+
+def compare(report, baseline, tolerance=0.15):
+	'''
+	Print how every benchmark changed against a baseline report.
+	Returns the names of the benchmarks that are more than tolerance slower.
+	'''
+	regressions = []
+	for name, result in report['benchmarks'].items():
+		if name not in baseline['benchmarks']:
+			print(f"{name:<32}{result['value']:>14.1f} {result['unit']:<8} (new)")
+			continue
+		old = baseline['benchmarks'][name]['value']
+		ratio = result['value'] / old if old else float('inf')
+		slower = ratio < 1 - tolerance
+		if slower:
+			regressions.append(name)
+		print(f"{name:<32}{result['value']:>14.1f} {result['unit']:<8} {ratio - 1:+8.1%}{'  REGRESSION' if slower else ''}")
+	return regressions
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmark the connect4 engine')
+	parser.add_argument('-only', default='', type=str, help='Comma separated benchmarks to run (default all). Use any of the following: [' + ', '.join(benchmarks) + ']')
+	parser.add_argument('-repeat', default=5, type=int, help='Timed runs of each benchmark, the median is reported')
+	parser.add_argument('-out', default='', type=str, help='File to write the JSON report to (default stdout)')
+	parser.add_argument('-baseline', default='', type=str, help='JSON report to compare against')
+	parser.add_argument('-tolerance', default=0.15, type=float, help='Fraction a benchmark may get slower than the baseline before it counts as a regression')
+	args = parser.parse_args()
+
+	names = args.only.split(',') if args.only else None
+	report = runBenchmarks(names, args.repeat, progress=lambda line: print(line, file=sys.stderr))
+	text = json.dumps(report, indent=2, sort_keys=True)
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(text + '\n')
+	elif not args.baseline:
+		print(text)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		if compare(report, baseline, args.tolerance):
+			sys.exit(1)
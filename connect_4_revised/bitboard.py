@@ -0,0 +1,259 @@
+import numpy as np
+import random
+from functools import lru_cache
+from evaluation import incrementalEvaluator
+
+@lru_cache(maxsize=None)
+def zobristKeys(board_shape):
+	'''
+	Random 64-bit Zobrist keys for each player and bit index of a board shape.
+	Generated from a fixed seed so the same position hashes the same in every process.
+	'''
+	rng = random.Random(170)
+	size = board_shape[1] * (board_shape[0]+1)
+	return tuple(tuple(rng.getrandbits(64) for _ in range(size)) for _ in range(2))
+
+@lru_cache(maxsize=None)
+def mirroredZobristKeys(board_shape):
+	'''
+	Zobrist keys indexed by bit, each one being the key of the bit's mirror image, so
+	hashing a position with them gives the hash of the position flipped left to right
+	'''
+	keys = zobristKeys(board_shape)
+	H = board_shape[0] + 1
+	cols = board_shape[1]
+	return tuple(tuple(playerKeys[(cols-1 - bit//H)*H + bit%H] for bit in range(len(playerKeys))) for playerKeys in keys)
+
+def connected(b, H, n=4):
+	'''
+	Does bitboard b (with H bits per column) have n connected pieces anywhere?
+	'''
+	# vertical, horizontal, and the two diagonals
+	for shift in (1, H, H+1, H-1):
+		# m marks the start of every run of k pieces. Runs of k overlapping by up to k
+		# make longer runs, so the length doubles each step until it reaches n
+		m = b
+		k = 1
+		while k < n:
+			step = min(k, n - k)
+			m &= m >> (step*shift)
+			k += step
+		if m:
+			return True
+	return False
+
+def mirror(b, board_shape):
+	'''
+	Bitboard b flipped left to right
+	'''
+	H = board_shape[0] + 1
+	cols = board_shape[1]
+	column = (1 << H) - 1
+	m = 0
+	for c in range(cols):
+		m |= ((b >> (c*H)) & column) << ((cols-1-c)*H)
+	return m
+
+def symmetric(boards, board_shape):
+	'''
+	Is the position with these bitboards its own mirror image?
+	'''
+	return all(mirror(b, board_shape) == b for b in boards)
+
+def positionKey(boards, board_shape):
+	'''
+	Integer that identifies a position exactly: player1's pieces plus the occupied cells
+	plus the bottom row, so every column holds a 1 just above its pieces. Whose turn it is
+	follows from the number of pieces. Fits in 64 bits when cols*(rows+1) <= 64.
+	'''
+	H = board_shape[0] + 1
+	bottom = sum(1 << (c*H) for c in range(board_shape[1]))
+	return boards[0] + (boards[0] | boards[1]) + bottom
+
+def canonicalKey(boards, board_shape):
+	'''
+	(key, mirrored): the smaller of the position's key and its mirror image's key, so
+	both sides of a symmetric pair share one key. mirrored says the key is the mirror's.
+	'''
+	key = positionKey(boards, board_shape)
+	mirroredKey = mirror(key, board_shape)
+	return (mirroredKey, True) if mirroredKey < key else (key, False)
+
+class bitboard():
+	'''
+	Game state stored as two integer bitboards (one per player) plus a height vector.
+
+	Each column takes up rows+1 bits. Bit h of column c is the cell h pieces above
+	the bottom of that column, which is row (rows-1-h) of the NumPy board. The extra
+	bit at the top of every column is always empty, so shifted patterns can never
+	wrap around from one column into the next.
+
+	Exposes the same topPosition / board / gameOver surface as connect4 so it can be
+	used anywhere a player expects a connect4 environment.
+	'''
+	def __init__(self, board_shape=(6,7), n=4):
+		self.shape = board_shape
+		self.n = n # pieces in a row needed to win
+		self.H = board_shape[0] + 1 # bits per column, including the sentinel bit
+
+		self.boards = [0, 0] # bitboards for player1 and player2
+		self.heights = [0] * board_shape[1] # number of pieces in each column
+		self.moves = 0 # number of pieces on the board
+
+		# Zobrist hash of the position and of its mirror image, updated incrementally as
+		# pieces are placed and removed
+		self.zobrist = zobristKeys(tuple(board_shape))
+		self.mirrorZobrist = mirroredZobristKeys(tuple(board_shape))
+		self.hash = 0
+		self.mirrorHash = 0
+
+		# Optional incrementalEvaluator kept in sync with every placed and removed piece
+		self.evaluator = None
+
+		# Same meaning as connect4.topPosition, kept in sync for players that read it
+		self.topPosition = (np.ones(board_shape[1]) * (board_shape[0]-1)).astype('int32')
+
+		self.is_winner = False
+		self.history = [[], []]
+		self.moveStack = [] # (column, player, is_winner) for every apply_move
+
+	@classmethod
+	def fromBoard(cls, board, n=4):
+		'''
+		Build a bitboard from a NumPy board array (0 = empty, 1/2 = player pieces)
+		'''
+		state = cls(board.shape, n)
+		for c in range(board.shape[1]):
+			for r in range(board.shape[0]-1, -1, -1):
+				if board[r][c] == 0:
+					break
+				state.placeBit(c, board[r][c])
+				state.topPosition[c] -= 1
+		return state
+
+	def computeHash(self, mirrored=False):
+		'''
+		Zobrist hash of the position (or of its mirror image) computed from scratch
+		'''
+		keys = self.mirrorZobrist if mirrored else self.zobrist
+		h = 0
+		for player in range(2):
+			b = self.boards[player]
+			while b:
+				low = b & -b
+				h ^= keys[player][low.bit_length()-1]
+				b ^= low
+		return h
+
+	def canonicalHash(self):
+		'''
+		(hash, mirrored): the smaller of the position's hash and its mirror image's hash,
+		so a position and its mirror image share transposition table entries.
+		mirrored says the hash is the mirror image's, whose moves are flipped.
+		'''
+		if self.mirrorHash < self.hash:
+			return self.mirrorHash, True
+		return self.hash, False
+
+	def isSymmetric(self):
+		'''
+		Is the position its own mirror image?
+		'''
+		return symmetric(self.boards, self.shape)
+
+	@property
+	def board(self):
+		'''
+		NumPy view of the position in the same layout as connect4.board
+		'''
+		board = np.zeros(self.shape).astype('int32')
+		for c in range(self.shape[1]):
+			for h in range(self.heights[c]):
+				bit = 1 << (c*self.H + h)
+				board[self.shape[0]-1-h][c] = 1 if self.boards[0] & bit else 2
+		return board
+
+	def attachEvaluator(self):
+		'''
+		Start keeping an incrementalEvaluator up to date for this position
+		'''
+		self.evaluator = incrementalEvaluator(self.shape, self.n)
+		for player in (1, 2):
+			b = self.boards[player-1]
+			while b:
+				low = b & -b
+				self.evaluator.update(low.bit_length()-1, player, 1)
+				b ^= low
+		return self.evaluator
+
+	def placeBit(self, column, player):
+		'''
+		Set the bit for player's piece on top of column (bitboards and heights only)
+		'''
+		bit = column*self.H + self.heights[column]
+		self.boards[player-1] |= 1 << bit
+		self.hash ^= self.zobrist[player-1][bit]
+		self.mirrorHash ^= self.mirrorZobrist[player-1][bit]
+		self.heights[column] += 1
+		self.moves += 1
+		if self.evaluator is not None:
+			self.evaluator.update(bit, player, 1)
+
+	def removeBit(self, column, player):
+		'''
+		Clear the top bit of column, which must belong to player
+		'''
+		self.heights[column] -= 1
+		self.moves -= 1
+		bit = column*self.H + self.heights[column]
+		self.boards[player-1] ^= 1 << bit
+		self.hash ^= self.zobrist[player-1][bit]
+		self.mirrorHash ^= self.mirrorZobrist[player-1][bit]
+		if self.evaluator is not None:
+			self.evaluator.update(bit, player, -1)
+
+	def dropPiece(self, column, player):
+		'''
+		Place player's piece on top of column
+		'''
+		self.placeBit(column, player)
+		self.topPosition[column] -= 1
+		self.history[player-1].append(column)
+
+	def apply_move(self, column, player):
+		'''
+		Play player's piece in column in place. Returns True if the move ended the game.
+		Revert it with undo_move.
+		'''
+		self.moveStack.append((column, player, self.is_winner))
+		self.dropPiece(column, player)
+		return self.gameOver(column, player)
+
+	def undo_move(self):
+		'''
+		Revert the most recent apply_move
+		'''
+		column, player, is_winner = self.moveStack.pop()
+		self.removeBit(column, player)
+		self.topPosition[column] += 1
+		self.history[player-1].pop()
+		self.is_winner = is_winner
+
+	def isWin(self, player):
+		'''
+		Does player have n connected pieces anywhere on the board?
+		'''
+		return connected(self.boards[player-1], self.H, self.n)
+
+	def isFull(self):
+		return self.moves == self.shape[0]*self.shape[1]
+
+	def gameOver(self, j, player):
+		'''
+		Same contract as connect4.gameOver. The column j is not needed since the
+		whole board is checked at once.
+		'''
+		if self.isWin(player):
+			self.is_winner = True
+			return True
+		return self.isFull()
@@ -0,0 +1,276 @@
+import os
+import random
+import tempfile
+import numpy as np
+from connect4 import connect4
+from gamestate import GameState
+from bitboard import connected
+from players import randomAI
+from records import HEADERS, encodeGame, readGames, gameWriter, openWriter
+from solver import endgameSolver
+from threats import shapeMasks, winningCells, threatMasks, forcedColumn, safeColumns
+
+'''
+Brute-force checks of the fast paths, run by test.py before its gauntlet.
+
+Each check compares bit tricks or binary formats with the slow way of doing the same
+thing on random positions of several board shapes and win lengths (or random game
+records), and returns a list of what went wrong (empty if nothing did):
+- checkThreats: threats.winningCells (on Python ints and uint64 arrays), forcedColumn
+  and safeColumns
+- checkSolver: endgameSolver's scores and moves against a search of every move
+- checkRecords: game records written and read back, including truncated files and
+  b'C4G1' records
+
+runChecks runs every check from one seed.
+'''
+
+def randomPosition(board_shape, n, rng, empty, quiet=False):
+	'''
+	GameState with `empty` empty cells reached by random moves that don't win, or None if
+	the moves didn't get there. A quiet position is reached by moves that don't hand the
+	opponent a win either, and neither player can win next move in it.
+	'''
+	rows, cols = board_shape
+	state = GameState(board_shape, (0, 0), (0,) * cols, 1, 0, n)
+	while rows * cols - state.ply > empty:
+		moves = safeColumns(state.boards, state.turn, board_shape, n) if quiet else state.legalMoves()
+		rng.shuffle(moves)
+		for c in moves:
+			after = state.play(c)
+			if not connected(after.boards[state.turn-1], rows+1, n):
+				break
+		else:
+			return None
+		state = after
+	if quiet:
+		_, winning, blocks, _ = threatMasks(state.boards, state.turn, board_shape, n)
+		if winning or blocks:
+			return None
+	return state
+
+def randomPositions(board_shape, n, rng, count, most=None, quiet=False):
+	'''
+	count random positions with at least one legal move and at most `most` empty cells
+	(any number if None)
+	'''
+	size = board_shape[0] * board_shape[1]
+	found = []
+	while len(found) < count:
+		state = randomPosition(board_shape, n, rng, rng.randint(1, most or size), quiet)
+		if state is not None:
+			found.append(state)
+	return found
+
+def wins(state, player, cell):
+	'''
+	Would player have n in a row with a piece on cell (bit index)? Counts the run through
+	it in every direction.
+	'''
+	rows, cols = state.shape
+	H = rows + 1
+	b = state.boards[player-1] | (1 << cell)
+	c, h = divmod(cell, H)
+	for dc, dh in ((0, 1), (1, 0), (1, 1), (1, -1)):
+		run = 1
+		for sign in (1, -1):
+			cc, hh = c + sign*dc, h + sign*dh
+			while 0 <= cc < cols and 0 <= hh < rows and b >> (cc*H + hh) & 1:
+				run += 1
+				cc, hh = cc + sign*dc, hh + sign*dh
+		if run >= state.n:
+			return True
+	return False
+
+def playWins(state, player, column):
+	'''
+	Would player win by dropping a piece in column?
+	'''
+	return wins(state, player, column*(state.shape[0]+1) + state.heights[column])
+
+def checkThreats(rng, shapes=((6,7,4), (6,7,3), (5,5,2), (7,9,5), (8,8,6), (12,14,5)), positions=200):
+	'''
+	Compare the threat masks with brute force. shapes are (rows, cols, n).
+	'''
+	problems = []
+	for rows, cols, n in shapes:
+		states = randomPositions((rows, cols), n, rng, positions)
+		H, _, boardMask, _ = shapeMasks((rows, cols))
+		mismatches = {'winningCells': 0, 'forcedColumn': 0, 'safeColumns': 0}
+		for state in states:
+			mask = state.boards[0] | state.boards[1]
+			for player in (1, 2):
+				cells = sum(1 << (c*H + h) for c in range(cols) for h in range(rows)
+					if not mask >> (c*H + h) & 1 and wins(state, player, c*H + h))
+				if winningCells(state.boards[player-1], mask, H, boardMask, n) != cells:
+					mismatches['winningCells'] += 1
+					break
+
+			# A winning move if there is one, otherwise a block, otherwise none
+			legal = state.legalMoves()
+			forced = ([c for c in legal if playWins(state, state.turn, c)]
+				or [c for c in legal if playWins(state, 3 - state.turn, c)] or [-1])
+			if forcedColumn(state.boards, state.turn, state.shape, n) not in forced:
+				mismatches['forcedColumn'] += 1
+
+			# Moves after which the opponent can't win right away, or all of them if there are none
+			afters = [state.play(c) for c in legal]
+			safe = [c for c, after in zip(legal, afters) if not any(playWins(after, after.turn, r) for r in after.legalMoves())]
+			if safeColumns(state.boards, state.turn, state.shape, n) != (safe or legal):
+				mismatches['safeColumns'] += 1
+		for name, count in mismatches.items():
+			if count:
+				problems.append(f"{rows}x{cols} connect-{n}: {name} differs from brute force in {count} of {positions} positions")
+
+		# Batched rollouts run winningCells on uint64 arrays, which must agree with Python ints
+		if cols * H <= 64:
+			masks = [state.boards[0] | state.boards[1] for state in states]
+			differs = np.zeros(len(states), dtype=bool)
+			for player in (1, 2):
+				bits = [state.boards[player-1] for state in states]
+				batched = winningCells(np.array(bits, dtype=np.uint64), np.array(masks, dtype=np.uint64), H, np.uint64(boardMask), n)
+				differs |= batched != np.array([winningCells(b, m, H, boardMask, n) for b, m in zip(bits, masks)], dtype=np.uint64)
+			if differs.any():
+				problems.append(f"{rows}x{cols} connect-{n}: winningCells on uint64 arrays differs from Python ints in {int(differs.sum())} of {positions} positions")
+	return problems
+
+def bruteScore(state, memo):
+	'''
+	The solver's score of a position found by searching every move: for a win, the number
+	of the winner's pieces still unplayed when they win plus one, negative for a loss
+	'''
+	if state.boards not in memo:
+		legal = state.legalMoves()
+		winning = [c for c in legal if playWins(state, state.turn, c)] # no need to look further
+		memo[state.boards] = max(moveScore(state, c, memo) for c in winning or legal)
+	return memo[state.boards]
+
+def moveScore(state, column, memo):
+	'''
+	Score for the player to move of playing column, searching every move after it
+	'''
+	if playWins(state, state.turn, column):
+		return (state.shape[0] * state.shape[1] + 1 - state.ply) // 2
+	after = state.play(column)
+	return -bruteScore(after, memo) if after.legalMoves() else 0
+
+def checkSolver(rng, shapes=((4,4,3,16), (4,5,3,14), (5,4,4,14), (3,4,2,12), (6,7,4,10), (6,7,5,10)), positions=40):
+	'''
+	Compare the endgame solver with a search of every move. shapes are (rows, cols, n,
+	most empty cells): small boards are solved from any depth, 6x7 only late in the game.
+	The positions are quiet so the solver has to search rather than take or block a win.
+	'''
+	problems = []
+	for rows, cols, n, most in shapes:
+		solver = endgameSolver((rows, cols), n=n)
+		memo = {}
+		for state in randomPositions((rows, cols), n, rng, positions, most, quiet=True):
+			score, move = solver.solve(state)
+			expected = bruteScore(state, memo)
+			if score != expected or move not in state.legalMoves() or moveScore(state, move, memo) != expected:
+				problems.append(f"{rows}x{cols} connect-{n}: boards {state.boards} turn {state.turn} solved as {(score, move)}, brute force scores {expected}")
+	return problems
+
+def randomRecord(rng, number):
+	'''
+	A game record dict with random contents, as connect4.gameRecord makes them
+	'''
+	rows, cols = rng.randint(1, 16), rng.randint(1, 16)
+	count = rng.randint(0, rows * cols)
+	return {
+		'game': number,
+		'shape': (rows, cols),
+		'n': rng.randint(1, 16),
+		'players': (rng.choice(['alphaBetaAI', 'randomAI', 'joueur', 'игрок']), rng.choice(['monteCarloAI', '']) * rng.randint(0, 2)),
+		'seeds': (rng.randint(-2**63, 2**63 - 1), rng.randint(-2**63, 2**63 - 1)),
+		'moves': [rng.randrange(cols) for _ in range(count)],
+		'times': [rng.random() * 5 for _ in range(count)],
+		'winner': rng.randint(0, 2)}
+
+def encodeLegacy(game):
+	'''
+	Bytes of a b'C4G1' record, which has no win length
+	'''
+	header = HEADERS[b'C4G1']
+	names = [name.encode('utf-8') for name in game['players']]
+	body = names[0] + names[1] + bytes(game['moves']) + np.asarray(game['times'], dtype='<f4').tobytes()
+	return header.pack(b'C4G1', header.size - 8 + len(body), game['game'], game['shape'][0], game['shape'][1],
+		game['winner'], len(names[0]), len(names[1]), len(game['moves']), game['seeds'][0], game['seeds'][1]) + body
+
+def sameRecord(written, read):
+	'''
+	Was the record read back as written? Times are stored as float32.
+	'''
+	expected = dict(written, shape=tuple(written['shape']), players=tuple(written['players']), seeds=tuple(written['seeds']),
+		times=np.asarray(written['times'], dtype=np.float32).tolist())
+	return read == expected
+
+def checkRecords(rng, games=200):
+	'''
+	Write random game records, read them back and compare, including truncated, old
+	format and corrupt files
+	'''
+	with tempfile.TemporaryDirectory() as directory:
+		problems = []
+		records = [randomRecord(rng, i) for i in range(games)]
+
+		# Round trip through gameWriter, which buffers and appends
+		path = os.path.join(directory, 'games.c4r')
+		with gameWriter(path, buffer_size=1000) as writer:
+			for record in records:
+				writer.write(record)
+		read = list(readGames(path))
+		if len(read) != len(records) or not all(sameRecord(w, r) for w, r in zip(records, read)):
+			problems.append('records read back differ from the ones written')
+
+		# A truncated last record (e.g. from a killed process) is skipped, wherever it is cut
+		data = open(path, 'rb').read()
+		last = len(encodeGame(records[-1]))
+		for cut in sorted({1, 7, 8, 9, last // 2, last - 1}):
+			with open(path, 'wb') as f:
+				f.write(data[:-cut])
+			if [r['game'] for r in readGames(path)] != list(range(games - 1)):
+				problems.append(f'truncating the last record by {cut} bytes is not handled')
+
+		# Old b'C4G1' records are read as connect 4, mixed in with current ones
+		mixed = [dict(record, n=4) for record in records[:20]]
+		with open(path, 'wb') as f:
+			for i, record in enumerate(mixed):
+				f.write(encodeLegacy(record) if i % 2 else encodeGame(record))
+		read = list(readGames(path))
+		if len(read) != len(mixed) or not all(sameRecord(w, r) for w, r in zip(mixed, read)):
+			problems.append('b\'C4G1\' records are not read back correctly')
+
+		# Anything else is reported as corrupt rather than misread
+		with open(path, 'wb') as f:
+			f.write(encodeGame(records[0]) + b'XXXX' + encodeGame(records[1])[4:])
+		try:
+			list(readGames(path))
+			problems.append('a corrupt record was not reported')
+		except ValueError:
+			pass
+
+		# A played game is recorded with the moves that were played
+		path = os.path.join(directory, 'played.c4r')
+		c4 = connect4(randomAI(1, 1), randomAI(2, 2), board_shape=(5,6), save=True, record_path=path, game=7, n=3)
+		c4.play()
+		openWriter(path).close()
+		read = list(readGames(path))
+		if len(read) != 1 or not sameRecord(c4.gameRecord(), read[0]):
+			problems.append('a played game is not recorded as played')
+		return problems
+
+checks = [checkThreats, checkSolver, checkRecords]
+
+def runChecks(seed=170, progress=print):
+	'''
+	Run every check and return all of their problems. progress is called with each
+	check's name and problems as it finishes.
+	'''
+	problems = []
+	for check in checks:
+		found = check(random.Random(seed))
+		if progress is not None:
+			progress(check.__name__, found)
+		problems += found
+	return problems
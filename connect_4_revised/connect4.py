@@ -1,33 +1,23 @@
 import numpy as np
-import os, sys
-import pygame
+import os
 import random
-from thread import thread_with_trace
+from bitboard import bitboard
+from gamestate import GameState
+from deadline import deadline
+from enforcement import enforcers
+from renderer import renderer, pygameRenderer
+from records import openWriter
+from telemetry import moveDict, moveEntry, aggregate, writeEntry
 from copy import deepcopy
 import time
 
-def time_limit(func, args, timeout):
-	'''
-	Run func with given args and kill after timeout seconds
-	'''
-	t = thread_with_trace(target=func, args=args)
-	t.start()
-	t.join(timeout)
-	if t.is_alive():
-		t.kill()
-
 class connect4():
 	def __init__(self, player1, player2, board_shape=(6,7), visualize=False, game=0, save=False,
-		limit_players=[-1,-1], time_limit=[-1,-1], verbose=False, CVDMode=False, print_time_logs = False):
-
-		global screen
+		limit_players=[-1,-1], time_limit=[-1,-1], verbose=False, CVDMode=False, print_time_logs = False, backend='numpy', enforcement='trace',
+		record_path=os.path.join('history', 'games.c4r'), telemetry=None, n=4):
 
 		self.shape = board_shape
-		self.visualize = visualize # show the GUI be displayed
-
-		if self.visualize: 
-			pygame.init()
-			screen = pygame.display.set_mode(size)
+		self.n = n # pieces in a row needed to win
 
 		# An array that is the same shape as the board. 
 		# 0 represents an available position, 
@@ -42,6 +32,11 @@ class connect4():
 		# 0 means their is only the top position left 
 		# -1 means their are no empty spaces in this column
 		self.topPosition = (np.ones(board_shape[1]) * (board_shape[0]-1)).astype('int32')
+
+		# Optional bitboard mirror of the board used for fast win detection.
+		# 'numpy' scans the board array cell-by-cell, 'bitboard' uses shift-and-mask checks
+		self.bitboard = bitboard(board_shape, n) if backend == 'bitboard' else None
+
 		self.player1 = player1
 		self.player2 = player2
 		self.player1.opponent = self.player2
@@ -49,17 +44,34 @@ class connect4():
 
 		self.is_winner = False # track if a the game has a winner
 
-		self.visualize = visualize # show the GUI be displayed
+		# show the GUI. Human players that click on the board need it too
+		self.visualize = visualize or getattr(player1, 'needsDisplay', False) or getattr(player2, 'needsDisplay', False)
+
+		# pygame is only imported when there is something to draw
+		self.renderer = pygameRenderer(board_shape, CVDMode) if self.visualize else renderer()
 
 		self.turnPlayer = self.player1 # which player's turn is it? 
 		self.history = [[], []] # track history of moves played for each player
+		self.moveStack = [] # moves made with apply_move that can be reverted with undo_move
 		self.game = game # just an integer to track which number game this is for logging purposes 
 		self.save = save # should the results of this game be saved? 
+		self.record_path = record_path # record file games are appended to when saved (see records.py)
+		self.moveTimes = [] # seconds each move took, in the order the moves were played
+		self.telemetry = [] # one dict of search stats per move (see telemetry.py)
+		self.telemetry_path = telemetry # JSON lines file the stats are appended to, if any
 		self.limit = limit_players # are players are subject to a time limit for each move (-1 indicates no limit)
 		self.time_limits = time_limit # time limits (in seconds) for each player 
 		self.verbose = verbose # controls how much info is printed to the console
 		self.print_time_logs = print_time_logs
 
+		# How time-limited players are stopped at their deadline: 'trace', 'cooperative' or 'process' (see enforcement.py)
+		if enforcement not in enforcers:
+			raise ValueError(f"Unknown enforcement '{enforcement}'. Use any of the following: {list(enforcers)}")
+		if enforcement == 'process' and (player1.usesWorkerPool() or player2.usesWorkerPool()):
+			raise ValueError("The 'process' enforcement can't run players with worker pools (monteCarloAI's parallel mode or alphaBetaAI with more than one worker)")
+		self.enforcement = enforcement
+		self.enforcers = [enforcers[enforcement](player1), enforcers[enforcement](player2)]
+
 		# Make sure time limits are formatted acceptably
 		if len(self.time_limits) != 2:
 			self.time_limits = [0.5,0.5]
@@ -68,13 +80,6 @@ class connect4():
 		if self.time_limits[1] <= 0:
 			self.time_limits[1] = 0.5
 
-		# Just changes the color of the pieces if true
-		if CVDMode:
-			global P1COLOR
-			global P2COLOR
-			P1COLOR = (227, 60, 239)
-			P2COLOR = (0, 255, 0)
-
 
 	def playTurn(self):
 		'''
@@ -82,27 +87,32 @@ class connect4():
 		'''
 		
 		# Move is stored in a dict, so that it can be passed and updated by reference.
-		move_dict = {"move" : self.randMove()}
+		move_dict = moveDict({"move" : self.randMove()})
 		
 		# If player should be time-limited, enforce a time limit
 		start = time.time()
-		if self.turnPlayer.position in self.limit:
-			time_limit(self.turnPlayer.play, (self.getEnv(),move_dict,), self.time_limits[self.turnPlayer.position-1])
-
-			# If over time limit, then assign a random move
-			if time.time() - start > self.time_limits[self.turnPlayer.position-1]:
-				move_dict['move'] = self.randMove()
-				if self.print_time_logs:
-					print(f"Player {self.turnPlayer.position} move exceeded {self.time_limits[self.turnPlayer.position-1]}s time limit and was terminated. A random move will be chosen")
-			else: 
-				if self.print_time_logs:
+
+		# Let the player see how much of its time limit is left
+		limited = self.turnPlayer.position in self.limit
+		move_dict["deadline"] = deadline(self.time_limits[self.turnPlayer.position-1] if limited else None, start)
+
+		if limited:
+			# The latest move the player published before its deadline is played
+			finished = self.enforcers[self.turnPlayer.position-1].play(self.getState(), move_dict)
+			if self.print_time_logs:
+				if finished:
 					print(f"Player {self.turnPlayer.position} move successfully completed in {round(time.time() - start, 2)}s")
+				else:
+					print(f"Player {self.turnPlayer.position} move reached its {self.time_limits[self.turnPlayer.position-1]}s time limit and was stopped. Its latest move will be played")
 		else:
-			self.turnPlayer.play(self.getEnv(), move_dict)
+			self.turnPlayer.play(self.getState(), move_dict)
+			finished = True
 			if self.print_time_logs:
 				print(f"Player {self.turnPlayer.position} move successfully completed in {round(time.time() - start, 2)}s")
 
-		move = move_dict["move"]
+		end = time.time()
+		self.moveTimes.append(end - start)
+		move = int(move_dict["move"])
 
 		# Correct illegal move (assign random)
 		if self.topPosition[move] < 0:
@@ -112,11 +122,16 @@ class connect4():
 				if p: indices.append(i)
 			move = random.choice(indices)
 		
-		# Update board with move
-		self.board[self.topPosition[move]][move] = self.turnPlayer.position
+		# Record the search stats of the move
+		entry = moveEntry(move_dict, start, end, game=self.game, ply=len(self.moveTimes)-1, player=self.turnPlayer.position,
+			agent=type(self.turnPlayer).__name__, move=move,
+			limit=self.time_limits[self.turnPlayer.position-1] if limited else None, stopped=not finished)
+		self.telemetry.append(entry)
+		if self.telemetry_path:
+			writeEntry(self.telemetry_path, entry)
 
-		# Track that position is no longer available
-		self.topPosition[move] -= 1
+		# Update board with move
+		self.dropPiece(move, self.turnPlayer.position)
 
 		# Track move in history
 		self.history[self.turnPlayer.position-1].append(move)
@@ -124,8 +139,7 @@ class connect4():
 		# Change which player's turn it is
 		self.turnPlayer = self.turnPlayer.opponent
 
-		if self.visualize:
-			self.draw_board()
+		self.renderer.drawBoard(self.board)
 
 		if self.verbose:
 			print(self.board)
@@ -136,8 +150,7 @@ class connect4():
 		'''
 		Base game loop
 		'''
-		if self.visualize:
-			self.draw_board() # draw current state of the board
+		self.renderer.drawBoard(self.board) # draw current state of the board
 
 		# Get the first player's first move
 		player = self.turnPlayer.position 
@@ -145,16 +158,16 @@ class connect4():
 
 		# Play until the game is over
 		while not self.gameOver(move, player):
-			if self.visualize:
-				for event in pygame.event.get():
-					if event.type == pygame.QUIT:
-						pygame.quit()
-						sys.exit()
+			self.renderer.pollEvents()
 			
 			player = self.turnPlayer.position
 			
 			move = self.playTurn()
 
+		# Stop any player processes
+		for enforcer in self.enforcers:
+			enforcer.close()
+
 		# Record the moves that were made
 		if self.save:
 			self.saveGame()
@@ -172,14 +185,8 @@ class connect4():
 				print('The game has tied')
 
 		# Continue visualizing the board after game is over until GUI is closed		
-		spectating = True
-		while spectating and self.visualize:
-			for event in pygame.event.get():
-				if event.type == pygame.QUIT:
-					pygame.quit()
-					sys.exit()
-					spectating = False
-					break
+		while self.visualize:
+			self.renderer.pollEvents()
 
 		return winner
 
@@ -187,16 +194,25 @@ class connect4():
 		'''
 		Determine if the game is over or not. 
 		The game is over if: 
-		- There are 4 connected pieces of the same color in a row, column, or diagonal
+		- There are n connected pieces of the same color in a row, column, or diagonal
 		- All positions are filled and no one has won
 		'''
 
+		if self.bitboard is not None:
+			if not self.bitboard.isWin(player):
+				return self.bitboard.isFull()
+			if not self.visualize:
+				self.is_winner = True
+				return True
+			# Fall through to the scan below so the winning line gets drawn
+
 		# Find extrema to consider
+		n = self.n
 		i = self.topPosition[j] + 1
-		minRowIndex = max(j - 3, 0)
-		maxRowIndex = min(j + 3, self.shape[1]-1)
-		maxColumnIndex = max(i - 3, 0)
-		minColumnIndex = min(i + 3, self.shape[0]-1)
+		minRowIndex = max(j - (n-1), 0)
+		maxRowIndex = min(j + (n-1), self.shape[1]-1)
+		maxColumnIndex = max(i - (n-1), 0)
+		minColumnIndex = min(i + (n-1), self.shape[0]-1)
 
 		# Iterate over extrema to find patterns
 
@@ -207,10 +223,8 @@ class connect4():
 				count += 1
 			else:
 				count = 0
-			if count == 4:
-				if self.visualize:
-					pygame.draw.line(screen, WHITE, (int(s*SQUARESIZE+SQUARESIZE/2), int((i+1.5)*SQUARESIZE)), (int((s-4)*SQUARESIZE+SQUARESIZE+SQUARESIZE/2), int((i+1.5)*SQUARESIZE)), 5)
-					pygame.display.update()
+			if count == n:
+				self.renderer.drawWinLine((i, s), (i, s-(n-1)))
 				self.is_winner = True 
 				return True
 			
@@ -221,10 +235,8 @@ class connect4():
 				count += 1
 			else:
 				count = 0
-			if count == 4:
-				if self.visualize:
-					pygame.draw.line(screen, WHITE, (int(j*SQUARESIZE+SQUARESIZE/2), int((s+2)*SQUARESIZE)), (int(j*SQUARESIZE+SQUARESIZE/2), int((s-2)*SQUARESIZE)), 5)
-					pygame.display.update()
+			if count == n:
+				self.renderer.drawWinLine((s, j), (s-(n-1), j))
 				self.is_winner = True 
 				return True
 			
@@ -243,11 +255,9 @@ class connect4():
 			count += 1
 			row += 1
 			col += 1
-		if count >= 4:
-			if self.visualize:
-					# top, bottom
-					pygame.draw.line(screen, WHITE, (int((j+0.5-(down_count-1))*SQUARESIZE), int((i+1.5-(down_count-1))*SQUARESIZE)), (int((j+0.5+(4-down_count))*SQUARESIZE), int((i+1.5+(4-down_count))*SQUARESIZE)), 5)
-					pygame.display.update()
+		if count >= n:
+			# top, bottom
+			self.renderer.drawWinLine((i-(down_count-1), j-(down_count-1)), (i+(n-down_count), j+(n-down_count)))
 			self.is_winner = True 
 			return True
 		
@@ -266,27 +276,75 @@ class connect4():
 			count += 1
 			row -= 1
 			col += 1
-		if count >= 4:
-			if self.visualize:
-					# top, bottom
-					pygame.draw.line(screen, WHITE, (int((j+0.5-(down_count-1))*SQUARESIZE), int((i+1.5+(down_count-1))*SQUARESIZE)), (int((j+0.5+(4-down_count))*SQUARESIZE), int((i+1.5-(4-down_count))*SQUARESIZE)), 5)
-					pygame.display.update()
+		if count >= n:
+			# bottom, top
+			self.renderer.drawWinLine((i+(down_count-1), j-(down_count-1)), (i-(n-down_count), j+(n-down_count)))
 			self.is_winner = True 
 			return True
 		
-		# If there are no 4 connected pieces, have all positions been filled? 
+		# If there are no n connected pieces, have all positions been filled?
 		return len(self.history[0]) + len(self.history[1]) == self.shape[0]*self.shape[1]
 
+	def dropPiece(self, column, player):
+		'''
+		Place player's piece on top of column, keeping every board representation in sync
+		'''
+		self.board[self.topPosition[column]][column] = player
+		self.topPosition[column] -= 1 # track that position is no longer available
+		if self.bitboard is not None:
+			self.bitboard.placeBit(column, player)
+
+	def apply_move(self, column, player):
+		'''
+		Play player's piece in column in place, updating topPosition, history and is_winner.
+		Returns True if the move ended the game. Revert it with undo_move.
+		'''
+		self.moveStack.append((column, player, self.is_winner))
+		self.dropPiece(column, player)
+		self.history[player-1].append(column)
+		return self.gameOver(column, player)
+
+	def undo_move(self):
+		'''
+		Revert the most recent apply_move
+		'''
+		column, player, is_winner = self.moveStack.pop()
+		self.topPosition[column] += 1
+		self.board[self.topPosition[column]][column] = 0
+		if self.bitboard is not None:
+			self.bitboard.removeBit(column, player)
+		self.history[player-1].pop()
+		self.is_winner = is_winner
+
 	def saveGame(self):
-		''' 
-		Save each players moves out to a text file
 		'''
-		with open(os.path.join('history', 'game_'+str(self.game)+'_P1.txt'), 'w') as filehandle:
-			for item in self.history[0]:
-				filehandle.write('%s\n' % item)
-		with open(os.path.join('history', 'game_'+str(self.game)+'_P2.txt'), 'w') as filehandle:
-			for item in self.history[1]:
-				filehandle.write('%s\n' % item)
+		Append a record of the game to the record file
+		'''
+		openWriter(self.record_path).write(self.gameRecord())
+
+	def telemetrySummary(self):
+		'''
+		The game's search stats summed up per agent
+		'''
+		return aggregate(self.telemetry)
+
+	def gameRecord(self):
+		'''
+		The game as a dict in the format of records.readGames
+		'''
+		moves = []
+		for i in range(len(self.history[0]) + len(self.history[1])):
+			moves.append(self.history[i % 2][i // 2]) # player1 always moves first
+		winner = self.turnPlayer.opponent.position if self.is_winner else 0
+		return {
+			'game': self.game,
+			'shape': self.shape,
+			'n': self.n,
+			'players': (type(self.player1).__name__, type(self.player2).__name__),
+			'seeds': (getattr(self.player1, 'seed', 0), getattr(self.player2, 'seed', 0)),
+			'moves': moves,
+			'times': self.moveTimes,
+			'winner': winner}
 
 	def randMove(self):
 		'''
@@ -308,46 +366,17 @@ class connect4():
 		'''
 		Create a copy of the entire connect4 instance 
 		'''
-		return deepcopy(self)
-
-	'''Pygame code used with permission from Keith Galli.
-	Refer to https://github.com/KeithGalli/Connect4-Python for licensing'''
-
-	def draw_board(self):
+		# Player processes and the window can't be copied, and copies are for searching so they never draw
+		enforcers, display = self.enforcers, self.renderer
+		self.enforcers, self.renderer = None, renderer()
+		env = deepcopy(self)
+		self.enforcers, self.renderer = enforcers, display
+		env.visualize = False
+		return env
+
+	def getState(self):
 		'''
-		Create the GUI representation of the current board state
+		Create a lightweight immutable snapshot of the position for players
 		'''
-		for c in range(self.shape[1]):
-			for r in range(self.shape[0]):
-				pygame.draw.rect(screen, BLUE, (c*SQUARESIZE, r*SQUARESIZE+SQUARESIZE, SQUARESIZE, SQUARESIZE))
-				pygame.draw.circle(screen, BLACK, (int(c*SQUARESIZE+SQUARESIZE/2), int(r*SQUARESIZE+SQUARESIZE+SQUARESIZE/2)), RADIUS)
-		
-		for c in range(self.shape[1]):
-			for r in range(self.shape[0]):		
-				if self.board[r][c] == 1:
-					pygame.draw.circle(screen, P1COLOR, (int((c)*SQUARESIZE+SQUARESIZE/2), height-int((5-r)*SQUARESIZE+SQUARESIZE/2)), RADIUS)
-				elif self.board[r][c] == 2: 
-					pygame.draw.circle(screen, P2COLOR, (int((c)*SQUARESIZE+SQUARESIZE/2), height-int((5-r)*SQUARESIZE+SQUARESIZE/2)), RADIUS)
-		pygame.display.update()
-
-# Defining globals
-SQUARESIZE = 100
-BLUE = (0,0,255)
-BLACK = (0,0,0)
-P1COLOR = (255,0,0)
-P2COLOR = (255,255,0)
-WHITE = (255,255,255)
-
-ROW_COUNT = 6
-COLUMN_COUNT = 7
-
-SQUARESIZE = 100
-
-width = COLUMN_COUNT * SQUARESIZE
-height = (ROW_COUNT+1) * SQUARESIZE
-
-size = (width, height)
-
-RADIUS = int(SQUARESIZE/2 - 5)
-
-screen = None
\ No newline at end of file
+		b = self.bitboard if self.bitboard is not None else bitboard.fromBoard(self.board, self.n)
+		return GameState.fromBitboard(b, self.turnPlayer.position)
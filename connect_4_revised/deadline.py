@@ -0,0 +1,46 @@
+import time
+
+class deadline():
+	'''
+	The time by which a player's move has to be finished.
+	connect4 hands one to each player in move_dict["deadline"] so that searches can
+	check how much of their budget is left instead of being killed at the limit.
+	'''
+	def __init__(self, seconds=None, start=None):
+		start = time.time() if start is None else start
+		self.end = None if seconds is None else start + seconds # None means no limit
+		self.cancelled = False # set by cancel, for searches that stop at their own stopTime
+
+	def remaining(self):
+		'''
+		Seconds left before the deadline (inf if there is no limit)
+		'''
+		if self.end is None:
+			return float('inf')
+		return self.end - time.time()
+
+	def expired(self):
+		return self.remaining() <= 0
+
+	def cancel(self):
+		'''
+		End the deadline now, so players polling expired, remaining or cancelled stop searching
+		'''
+		self.end = time.time()
+		self.cancelled = True
+
+	def stopTime(self, fraction=0.9, margin=0.02):
+		'''
+		Absolute time at which a search should stop so its move is safely in before the
+		deadline (inf if there is no limit)
+		'''
+		remaining = self.remaining()
+		if remaining == float('inf'):
+			return remaining
+		return time.time() + remaining * fraction - margin
+
+class searchTimeout(Exception):
+	'''
+	Raised inside a search to unwind it when its time budget runs out
+	'''
+	pass
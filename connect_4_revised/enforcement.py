@@ -0,0 +1,146 @@
+import multiprocessing
+import threading
+from thread import thread_with_trace
+from parallel import initWorker
+from telemetry import moveDict
+
+'''
+Ways of holding a time-limited player to its move deadline.
+
+Each enforcer runs player.play(state, move_dict) and returns once the player has finished
+or its deadline has passed, whichever comes first. Whatever is in move_dict["move"] at that
+point is the player's move, so a search that keeps publishing its best move so far still
+gets credit for it when time runs out.
+
+- 'trace' runs the player in a thread with sys.settrace installed and kills it at the limit.
+  It works for any player, but every line of Python the player runs goes through the trace
+  callback, which slows searches down considerably.
+- 'cooperative' runs the player in a plain thread at full speed and relies on it to stop by
+  move_dict["deadline"]. At the limit the deadline is cancelled and the move is taken as it
+  is; a player that ignores its deadline is left running in the background.
+- 'process' keeps each player in its own persistent subprocess that publishes its moves
+  (and when it set them) through shared memory. A player still running at the limit is
+  terminated and a fresh process is started for its next move. Players keep their state between moves (e.g. their
+  transposition table) as long as they finish in time.
+'''
+
+class traceEnforcer():
+	def __init__(self, player):
+		self.player = player
+
+	def play(self, state, move_dict):
+		t = thread_with_trace(target=self.player.play, args=(state, move_dict))
+		t.start()
+		t.join(max(move_dict["deadline"].remaining(), 0))
+		if t.is_alive():
+			t.kill()
+			return False
+		return True
+
+	def close(self):
+		pass
+
+class cooperativeEnforcer():
+	def __init__(self, player):
+		self.player = player
+
+	def play(self, state, move_dict):
+		t = threading.Thread(target=self.player.play, args=(state, move_dict), daemon=True)
+		t.start()
+		t.join(max(move_dict["deadline"].remaining(), 0))
+		if t.is_alive():
+			move_dict["deadline"].cancel()
+			return False
+		return True
+
+	def close(self):
+		pass
+
+class sharedMoveDict(moveDict):
+	'''
+	move_dict handed to a player in its own process: every move it publishes is also
+	written to shared memory where connect4 can read it, even if the process gets killed.
+	shared holds the move and the times it was first and last set (0 if never).
+	'''
+	def __init__(self, shared, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.shared = shared
+
+	def __setitem__(self, key, value):
+		super().__setitem__(key, value)
+		if key == "move":
+			self.shared[0] = int(value)
+			self.shared[1] = self.firstUpdate
+			self.shared[2] = self.lastUpdate
+
+def playerProcess(player, conn, shared):
+	'''
+	Body of a player's process: play every position sent through conn until told to stop,
+	sending back the player's stats after each one
+	'''
+	initWorker()
+	while True:
+		job = conn.recv()
+		if job is None:
+			break
+		state, deadline = job
+		move_dict = sharedMoveDict(shared, {"move": int(shared[0]), "deadline": deadline})
+		player.play(state, move_dict)
+		conn.send(move_dict.get("stats"))
+
+class processEnforcer():
+	'''
+	Processes are daemonic so they never outlive the game, which also means players in
+	them cannot start worker pools of their own (see connect4Player.usesWorkerPool).
+	A process that dies is handled like one that ran out of time.
+	'''
+	def __init__(self, player):
+		self.player = player
+		self.process = None
+
+	def start(self):
+		self.conn, child = multiprocessing.Pipe()
+		self.shared = multiprocessing.RawArray('d', 3) # no lock, so killing the player mid-write can't leave it held
+		self.process = multiprocessing.Process(target=playerProcess, args=(self.player, child, self.shared), daemon=True)
+		self.process.start()
+
+	def play(self, state, move_dict):
+		if self.process is None:
+			self.start()
+		self.shared[:] = [int(move_dict["move"]), 0, 0]
+		self.conn.send((state, move_dict["deadline"]))
+		finished = self.conn.poll(max(move_dict["deadline"].remaining(), 0))
+		if finished:
+			try:
+				stats = self.conn.recv()
+			except (EOFError, OSError):
+				# The process died, so treat it like a timeout and start a new one next move
+				finished = False
+			else:
+				if stats is not None:
+					move_dict["stats"] = stats
+		if not finished:
+			self.stop()
+		move, first, last = self.shared[:]
+		dict.__setitem__(move_dict, "move", int(move)) # the move was set in the player's process, not now
+		if isinstance(move_dict, moveDict) and first:
+			move_dict.firstUpdate, move_dict.lastUpdate = first, last
+		return finished
+
+	def stop(self):
+		self.process.terminate()
+		self.process.join()
+		self.conn.close()
+		self.process = None
+
+	def close(self):
+		if self.process is not None:
+			self.conn.send(None)
+			self.process.join(1)
+			if self.process.is_alive():
+				self.process.terminate()
+				self.process.join()
+			self.conn.close()
+			self.process = None
+
+enforcers = {'trace': traceEnforcer, 'cooperative': cooperativeEnforcer, 'process': processEnforcer}
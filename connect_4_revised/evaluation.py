@@ -0,0 +1,158 @@
+import numpy as np
+from functools import lru_cache
+
+'''
+Heuristic board evaluation shared by the search players.
+
+Every line of n cells that could hold a win (a "window") is scored from the counts
+of each player's pieces in it:
+- n of player's pieces: +1000 (a win)
+- n-1 of player's pieces and an empty cell: +100 (threatening to win)
+- n-2 of player's pieces and two empty cells: +10 (building a threat)
+- n-1 of opponent's pieces and an empty cell: -200 (must be blocked)
+- n-2 of opponent's pieces and two empty cells: -20
+The window lists and score tables only depend on the board shape and n, so they are
+built once and cached.
+'''
+
+def windowScore(mine, theirs, empty, n=4):
+	'''
+	Score one window holding mine/theirs/empty cells
+	'''
+	score = 0
+	if mine == n:
+		score += 1000  # Immediate win
+	elif mine == n-1 and empty == 1:
+		score += 100  # Potential win in next move
+	elif mine == n-2 and empty == 2:
+		score += 10   # Potential to build a threat
+
+	if theirs == n-1 and empty == 1:
+		score -= 200  # Block opponent's immediate win
+	elif theirs == n-2 and empty == 2:
+		score -= 20   # Block opponent's potential threat
+
+	return score
+
+@lru_cache(maxsize=None)
+def windowIndices(board_shape, n=4):
+	'''
+	Array of shape (windows, n) holding the flat board index of every cell of every window
+	'''
+	rows, cols = board_shape
+	windows = []
+	for r in range(rows):
+		for c in range(cols):
+			# horizontal, vertical, diagonal descending, diagonal ascending
+			for dr, dc in ((0,1), (1,0), (1,1), (-1,1)):
+				endRow, endCol = r + dr*(n-1), c + dc*(n-1)
+				if 0 <= endRow < rows and 0 <= endCol < cols:
+					windows.append([(r + dr*k)*cols + c + dc*k for k in range(n)])
+	return np.array(windows, dtype=np.intp).reshape(-1, n)
+
+@lru_cache(maxsize=None)
+def positionWeights(board_shape, n=4):
+	'''
+	Weight of every cell as rows of a (rows, cols) table: the number of windows through it,
+	i.e. how many ways there are to make n in a row with it
+	'''
+	rows, cols = board_shape
+	counts = np.bincount(windowIndices(board_shape, n).ravel(), minlength=rows*cols)
+	return tuple(tuple(int(x) for x in row) for row in counts.reshape(rows, cols))
+
+@lru_cache(maxsize=None)
+def windowCodePowers(n=4):
+	'''
+	Windows are encoded in base 3, cell k contributing (0, 1 or 2) * 3**k
+	'''
+	return 3 ** np.arange(n, dtype=np.int64)
+
+@lru_cache(maxsize=None)
+def scoreTable(player, n=4):
+	'''
+	Score of every possible window encoding, from player's point of view
+	'''
+	table = np.zeros(3**n, dtype=np.int64)
+	for code in range(3**n):
+		cells = [(code // 3**k) % 3 for k in range(n)]
+		table[code] = windowScore(cells.count(player), cells.count(3-player), cells.count(0), n)
+	return table
+
+def evaluate(board, player, n=4) -> int:
+	'''
+	Score a single (rows, cols) board from player's point of view
+	'''
+	windows = board.ravel()[windowIndices(board.shape, n)]
+	return int(scoreTable(player, n)[windows @ windowCodePowers(n)].sum())
+
+def evaluate_batch(boards, player, n=4):
+	'''
+	Score a stack of boards with shape (N, rows, cols) from player's point of view in one call.
+	Returns an int64 array of length N.
+	'''
+	boards = np.asarray(boards)
+	windows = boards.reshape(len(boards), -1)[:, windowIndices(boards.shape[1:], n)]
+	return scoreTable(player, n)[windows @ windowCodePowers(n)].sum(axis=1)
+
+class incrementalEvaluator():
+	'''
+	Keeps the evaluation of a bitboard up to date as pieces are added and removed.
+
+	Stores how many of each player's pieces are in every window, plus the running
+	total score from each player's point of view. Placing or removing a piece only
+	rescores the (at most 4*n) windows that pass through that cell. Attach one to a
+	bitboard with bitboard.attachEvaluator.
+	'''
+	def __init__(self, board_shape, n=4):
+		self.n = n
+		rows, cols = board_shape
+		windows = windowIndices(board_shape, n)
+
+		# Windows through each bitboard bit index (column*(rows+1) + height)
+		byCell = [[] for _ in range(rows*cols)]
+		for w, cells in enumerate(windows.tolist()):
+			for cell in cells:
+				byCell[cell].append(w)
+		self.bitWindows = [()] * (cols*(rows+1))
+		for c in range(cols):
+			for h in range(rows):
+				self.bitWindows[c*(rows+1) + h] = tuple(byCell[(rows-1-h)*cols + c])
+
+		# Score of a window from each player's point of view, indexed by
+		# player1 count * (n+1) + player2 count
+		pairScores = [
+			[windowScore(*((c1, c2) if p == 1 else (c2, c1)), n - c1 - c2, n) if c1 + c2 <= n else 0
+				for c1 in range(n+1) for c2 in range(n+1)]
+			for p in (1, 2)]
+
+		# For each (player, sign), how far a window's code moves and how much each
+		# player's score changes, indexed by the window's code before the update
+		size = (n+1)**2
+		self.steps = {}
+		for player in (1, 2):
+			for sign in (1, -1):
+				step = sign * (n + 1 if player == 1 else 1)
+				self.steps[player, sign] = (step,
+					tuple(pairScores[0][(code+step) % size] - pairScores[0][code] for code in range(size)),
+					tuple(pairScores[1][(code+step) % size] - pairScores[1][code] for code in range(size)))
+
+		self.codes = [0] * len(windows) # player1 count * (n+1) + player2 count for each window
+		self.scores = [pairScores[0][0] * len(windows), pairScores[1][0] * len(windows)] # total score from player1's and player2's point of view
+
+	def score(self, player) -> int:
+		return self.scores[player-1]
+
+	def update(self, bit, player, sign):
+		'''
+		Add (sign = 1) or remove (sign = -1) player's piece at a bitboard bit index
+		'''
+		step, d1, d2 = self.steps[player, sign]
+		codes = self.codes
+		s1 = s2 = 0
+		for w in self.bitWindows[bit]:
+			old = codes[w]
+			codes[w] = old + step
+			s1 += d1[old]
+			s2 += d2[old]
+		self.scores[0] += s1
+		self.scores[1] += s2
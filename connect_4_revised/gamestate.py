@@ -0,0 +1,90 @@
+import numpy as np
+from bitboard import bitboard, symmetric
+
+class GameState():
+	'''
+	Immutable snapshot of a connect4 position, handed to players each turn by connect4.getState.
+
+	Only holds the two player bitboards, the column heights, whose turn it is, how many
+	pieces have been played and how many in a row win, so building and copying one costs
+	the same no matter what the players or the game keep around. Players that want to
+	search should call toBitboard
+	to get a mutable position with apply_move/undo_move.
+	'''
+	__slots__ = ('shape', 'boards', 'heights', 'turn', 'ply', 'n')
+
+	def __init__(self, shape, boards, heights, turn, ply, n=4):
+		object.__setattr__(self, 'shape', tuple(shape))
+		object.__setattr__(self, 'boards', tuple(boards)) # bitboards for player1 and player2
+		object.__setattr__(self, 'heights', tuple(heights)) # number of pieces in each column
+		object.__setattr__(self, 'turn', turn) # position of the player to move
+		object.__setattr__(self, 'ply', ply) # number of pieces on the board
+		object.__setattr__(self, 'n', n) # pieces in a row needed to win
+
+	def __setattr__(self, name, value):
+		raise AttributeError('GameState is immutable')
+
+	# Snapshots never change, so copies can share the same object
+	def __copy__(self):
+		return self
+
+	def __deepcopy__(self, memo):
+		return self
+
+	def copy(self):
+		return self
+
+	# Rebuild through __init__ when unpickled (e.g. when sent to a worker process)
+	def __reduce__(self):
+		return (GameState, (self.shape, self.boards, self.heights, self.turn, self.ply, self.n))
+
+	@classmethod
+	def fromBitboard(cls, b, turn):
+		return cls(b.shape, b.boards, b.heights, turn, b.moves, b.n)
+
+	@property
+	def topPosition(self):
+		'''
+		Same meaning as connect4.topPosition
+		'''
+		return (self.shape[0] - 1 - np.array(self.heights)).astype('int32')
+
+	@property
+	def board(self):
+		'''
+		Same layout as connect4.board
+		'''
+		return self.toBitboard().board
+
+	def legalMoves(self):
+		return [c for c in range(self.shape[1]) if self.heights[c] < self.shape[0]]
+
+	def isSymmetric(self):
+		'''
+		Is the position its own mirror image?
+		'''
+		return symmetric(self.boards, self.shape)
+
+	def toBitboard(self):
+		'''
+		Create a mutable bitboard of this position for searching
+		'''
+		b = bitboard(self.shape, self.n)
+		b.boards = list(self.boards)
+		b.heights = list(self.heights)
+		b.moves = self.ply
+		b.topPosition = self.topPosition
+		b.hash = b.computeHash()
+		b.mirrorHash = b.computeHash(mirrored=True)
+		return b
+
+	def play(self, column):
+		'''
+		Return the snapshot after the player to move drops a piece in column
+		'''
+		H = self.shape[0] + 1
+		boards = list(self.boards)
+		boards[self.turn-1] |= 1 << (column*H + self.heights[column])
+		heights = list(self.heights)
+		heights[column] += 1
+		return GameState(self.shape, boards, heights, 3 - self.turn, self.ply + 1, self.n)
@@ -6,6 +6,7 @@ from montecarlo import monteCarloAI
 parser = argparse.ArgumentParser(description='Run programming assignment 2')
 parser.add_argument('-w', default=6, type=int, help='Rows of game')
 parser.add_argument('-l', default=7, type=int, help='Columns of game')
+parser.add_argument('-n', default=4, type=int, help='Pieces in a row needed to win')
 parser.add_argument('-p1', default='humanGUI', type=str, help='Player 1 agent. Use any of the following: [humanGUI, humanConsole, stupidAI, randomAI, monteCarloAI, minimaxAI, alphaBetaAI]')
 parser.add_argument('-p2', default='humanGUI', type=str, help='Player 2 agent. Use any of the following: [humanGUI, humanConsole, stupidAI, randomAI, monteCarloAI, minimaxAI, alphaBetaAI]')
 parser.add_argument('-seed', default=0, type=int, help='Seed for random algorithms')
@@ -14,6 +15,19 @@ parser.add_argument('-verbose', default='True', type=str, help='Print boards to
 parser.add_argument('-limit_players', default='1,2', type=str, help='Players to limit time for. List players as numbers eg [1,2]')
 parser.add_argument('-time_limit', default='1.0,1.0', type=str, help='Time limits for each player. Must be list of 2 elements > 0. Not used if player is not listed')
 parser.add_argument('-cvd_mode', default='False', type=str, help='Uses colorblind-friendly palette')
+parser.add_argument('-backend', default='numpy', type=str, help='Game state backend used for win detection. Use any of the following: [numpy, bitboard]')
+parser.add_argument('-tt_size', default=16, type=int, help='Memory cap in MB for the alphaBetaAI transposition table')
+parser.add_argument('-tt_replace', default='depth', type=str, help='Transposition table replacement policy. Use any of the following: [depth, always]')
+parser.add_argument('-mc_mode', default='batch', type=str, help='How monteCarloAI plays its random games. Use any of the following: [batch, flat, uct, parallel]')
+parser.add_argument('-mc_tactical', default='True', type=str, help='monteCarloAI random games take wins and block losses when they can instead of always moving at random')
+parser.add_argument('-workers', default=0, type=int, help='Worker processes for monteCarloAI parallel mode (0 uses every core)')
+parser.add_argument('-ab_workers', default=1, type=int, help='Worker processes for alphaBetaAI root splitting (1 searches in-process, 0 uses every core)')
+parser.add_argument('-ab_search', default='alphabeta', type=str, help="alphaBetaAI's search. Use any of the following: [alphabeta, pvs]. pvs is principal variation search with aspiration windows")
+parser.add_argument('-book', default='', type=str, help='Opening book file built with makebook.py for alphaBetaAI and monteCarloAI to play from (empty for none)')
+parser.add_argument('-endgame', default=16, type=int, help='alphaBetaAI and monteCarloAI solve the game exactly once this many cells or fewer are empty (0 turns the solver off)')
+parser.add_argument('-enforcement', default='trace', type=str, help='How time limits are enforced. Use any of the following: [trace, cooperative, process]. trace kills slow players but slows every search down, cooperative trusts players to stop at their deadline, process runs each player in its own process that is killed at the limit')
+parser.add_argument('-record', default='', type=str, help='Binary game record file to append each game to (empty to not save games). Read it back with records.readGames')
+parser.add_argument('-telemetry', default='', type=str, help="Per-move search stats: a JSON lines file to append them to, or 'counters' to print each agent's totals after the game (empty for neither)")
 parser.add_argument('-print_time_logs', default='False', type=str, help='Print metrics about how fast each turn takes, and if time limits are being exceeded')
 
 
@@ -21,24 +35,6 @@ parser.add_argument('-print_time_logs', default='False', type=str, help='Print m
 # Bools and argparse are not friends
 bool_dict = {'True': True, 'False': False}
 
-args = parser.parse_args()
-
-w = args.w
-l = args.l
-
-seed = args.seed
-visualize = bool_dict[args.visualize]
-verbose = bool_dict[args.verbose]
-limit_players = args.limit_players.split(',')
-print_time_logs = args.print_time_logs
-for i, v in enumerate(limit_players):
-	limit_players[i] = int(v)
-time_limit = args.time_limit.split(',')
-for i, v in enumerate(time_limit):
-	time_limit[i] = float(v)
-cvd_mode = bool_dict[args.cvd_mode]
-
-
 agents = {
 	'humanGUI': humanGUI, 
 	'humanConsole': humanConsole, 
@@ -49,9 +45,46 @@ agents = {
 	'alphaBetaAI': alphaBetaAI
 	}
 
+def agentOptions(args):
+	'''
+	Extra constructor arguments for agents that take them
+	'''
+	book = args.book or None
+	return {
+		'alphaBetaAI': {'tt_size': args.tt_size, 'tt_replace': args.tt_replace, 'workers': args.ab_workers, 'search': args.ab_search, 'book': book, 'endgame': args.endgame},
+		'monteCarloAI': {'mode': args.mc_mode, 'workers': args.workers, 'tactical': bool_dict[args.mc_tactical], 'book': book, 'endgame': args.endgame}
+		}
+
 if __name__ == '__main__':
 
-	player1 = agents[args.p1](1, seed, cvd_mode)
-	player2 = agents[args.p2](2, seed, cvd_mode)
-	c4 = connect4(player1, player2, board_shape=(w,l), visualize=visualize, limit_players=limit_players, time_limit=time_limit, verbose=verbose, CVDMode=cvd_mode, print_time_logs=print_time_logs)
-	c4.play()
\ No newline at end of file
+	args = parser.parse_args()
+
+	w = args.w
+	l = args.l
+
+	seed = args.seed
+	visualize = bool_dict[args.visualize]
+	verbose = bool_dict[args.verbose]
+	limit_players = args.limit_players.split(',')
+	print_time_logs = bool_dict[args.print_time_logs]
+	for i, v in enumerate(limit_players):
+		limit_players[i] = int(v)
+	time_limit = args.time_limit.split(',')
+	for i, v in enumerate(time_limit):
+		time_limit[i] = float(v)
+	cvd_mode = bool_dict[args.cvd_mode]
+
+	agent_options = agentOptions(args)
+
+	player1 = agents[args.p1](1, seed, cvd_mode, **agent_options.get(args.p1, {}))
+	player2 = agents[args.p2](2, seed, cvd_mode, **agent_options.get(args.p2, {}))
+	try:
+		c4 = connect4(player1, player2, board_shape=(w,l), visualize=visualize, limit_players=limit_players, time_limit=time_limit, verbose=verbose, CVDMode=cvd_mode, print_time_logs=print_time_logs, backend=args.backend, enforcement=args.enforcement, save=bool(args.record), record_path=args.record,
+			telemetry=args.telemetry if args.telemetry != 'counters' else None, n=args.n)
+	except ValueError as e:
+		parser.error(str(e))
+	c4.play()
+
+	if args.telemetry == 'counters':
+		for agent, totals in c4.telemetrySummary().items():
+			print(agent, totals)
\ No newline at end of file
@@ -0,0 +1,95 @@
+import argparse
+import time
+import numpy as np
+from bitboard import connected, canonicalKey
+from gamestate import GameState
+from openingbook import writeBook
+from parallel import workerPool
+from players import alphaBetaAI
+
+'''
+Build an opening book (see openingbook.py) for every position with up to `plies` pieces.
+
+Each position is searched by alphaBetaAI to a fixed depth, and its best move and value
+are stored under the position's canonical key. Searches are spread over a worker pool.
+
+	python makebook.py -plies 6 -depth 8 -out book.bin
+'''
+
+# alphaBetaAI searchers living in this (worker) process, one per player to move,
+# so transposition table entries are reused from one book position to the next
+searchers = {}
+
+def bookPositions(board_shape, plies, n=4):
+	'''
+	One GameState per canonical position with up to plies pieces where the game isn't over
+	'''
+	H = board_shape[0] + 1
+	start = GameState(board_shape, (0, 0), (0,) * board_shape[1], 1, 0, n)
+	positions = {canonicalKey(start.boards, board_shape)[0]: start}
+	frontier = [start]
+	for ply in range(plies):
+		following = []
+		for state in frontier:
+			for column in state.legalMoves():
+				after = state.play(column)
+				if connected(after.boards[state.turn-1], H, n) or after.ply == board_shape[0]*board_shape[1]:
+					continue
+				key = canonicalKey(after.boards, board_shape)[0]
+				if key not in positions:
+					positions[key] = after
+					following.append(after)
+		frontier = following
+	return list(positions.values())
+
+def searchTask(state, depth):
+	'''
+	Worker process job: (key, move, value) for one book position, with the move and
+	value stored for the position the canonical key stands for
+	'''
+	if state.turn not in searchers:
+		searchers[state.turn] = alphaBetaAI(state.turn)
+	searcher = searchers[state.turn]
+
+	env = state.toBitboard()
+	env.attachEvaluator()
+	columns = searcher.sortColumnsByValue(env)
+	for d in range(depth + 1):
+		value, move = searcher.searchRoot(env, d, columns, {})
+		columns.remove(move)
+		columns.insert(0, move)
+		if value in (np.inf, -np.inf):
+			break
+
+	key, mirrored = canonicalKey(state.boards, state.shape)
+	if mirrored:
+		move = state.shape[1] - 1 - move
+	return key, move, value
+
+def makeBook(path, board_shape=(6,7), plies=6, depth=8, workers=None, progress=print, n=4):
+	positions = bookPositions(board_shape, plies, n)
+	if progress is not None:
+		progress(f"Searching {len(positions)} positions to depth {depth}")
+	start = time.time()
+	entries = []
+	jobs = [(state, depth) for state in positions]
+	for entry in workerPool(workers).starmap(searchTask, jobs, chunksize=16):
+		entries.append(entry)
+	writeBook(path, board_shape, plies, entries, n)
+	if progress is not None:
+		progress(f"Wrote {len(entries)} positions to {path} in {round(time.time() - start, 1)}s")
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Build a connect4 opening book')
+	parser.add_argument('-w', default=6, type=int, help='Rows of game')
+	parser.add_argument('-l', default=7, type=int, help='Columns of game')
+	parser.add_argument('-n', default=4, type=int, help='Pieces in a row needed to win')
+	parser.add_argument('-plies', default=6, type=int, help='Book every position with up to this many pieces')
+	parser.add_argument('-depth', default=8, type=int, help='alphaBetaAI search depth for each position')
+	parser.add_argument('-workers', default=0, type=int, help='Worker processes (0 uses every core)')
+	parser.add_argument('-out', default='book.bin', type=str, help='Book file to write')
+	args = parser.parse_args()
+
+	if args.l * (args.w + 1) > 64:
+		parser.error('Book keys only fit boards where columns * (rows+1) <= 64')
+	makeBook(args.out, (args.w, args.l), args.plies, args.depth, args.workers, n=args.n)
@@ -0,0 +1,116 @@
+import math
+import random
+from bitboard import connected
+from rollout import randomGame
+
+class uctNode():
+	'''
+	One position in a uctTree, reached by `player` dropping a piece in column `move`.
+	wins are counted from the point of view of `player` (a tie counts as half a win).
+	'''
+	__slots__ = ('move', 'player', 'parent', 'children', 'untried', 'visits', 'wins', 'winner')
+
+	def __init__(self, move, player, parent, untried, winner=None):
+		self.move = move
+		self.player = player
+		self.parent = parent
+		self.children = []
+		self.untried = untried # legal moves that don't have a child node yet
+		self.visits = 0
+		self.wins = 0.0
+		self.winner = winner # None if the game is not over here, else the winner (0 for a tie)
+
+class uctTree():
+	'''
+	Monte Carlo tree search with UCB1 selection (UCT).
+
+	Each iteration walks down the tree picking the child with the best upper confidence
+	bound, adds one new child, plays a random game from it and updates the win counts
+	on the way back up. The tree can be re-rooted with advance once the game has moved
+	on, so the statistics of the part of the tree that is still reachable are reused.
+	With tactical, the random games win and block when they can (see rollout.randomGame).
+	'''
+	def __init__(self, state, c=1.4, rng=None, tactical=False):
+		self.c = c # exploration constant
+		self.rng = rng if rng is not None else random.Random()
+		self.tactical = tactical
+		self.reset(state)
+
+	def reset(self, state):
+		self.state = state # GameState at the root
+		self.root = uctNode(-1, 3 - state.turn, None, state.legalMoves())
+
+	def advance(self, state):
+		'''
+		Re-root the tree at state if it is the root position or two plies below it.
+		Returns True if old statistics were kept, otherwise starts a new tree at state.
+		'''
+		if state.boards == self.state.boards:
+			return True
+		for child in self.root.children:
+			after = self.state.play(child.move)
+			for grandchild in child.children:
+				if after.play(grandchild.move).boards == state.boards:
+					grandchild.parent = None
+					self.state = state
+					self.root = grandchild
+					return True
+		self.reset(state)
+		return False
+
+	def iterate(self):
+		'''
+		Run one selection / expansion / simulation / backpropagation pass
+		'''
+		rows, cols = self.state.shape
+		H = rows + 1
+		rng = self.rng
+		boards = list(self.state.boards)
+		heights = list(self.state.heights)
+		node = self.root
+
+		# Selection
+		while node.winner is None and not node.untried:
+			logVisits = math.log(node.visits)
+			c = self.c
+			node = max(node.children, key=lambda child: child.wins / child.visits + c * math.sqrt(logVisits / child.visits))
+			boards[node.player-1] |= 1 << (node.move*H + heights[node.move])
+			heights[node.move] += 1
+
+		# Expansion
+		if node.winner is None:
+			move = node.untried.pop(int(rng.random() * len(node.untried)))
+			player = 3 - node.player
+			boards[player-1] |= 1 << (move*H + heights[move])
+			heights[move] += 1
+			if connected(boards[player-1], H, self.state.n):
+				child = uctNode(move, player, node, [], player)
+			elif sum(heights) == rows*cols:
+				child = uctNode(move, player, node, [], 0)
+			else:
+				child = uctNode(move, player, node, [c for c in range(cols) if heights[c] < rows])
+			node.children.append(child)
+			node = child
+
+		# Simulation
+		if node.winner is not None:
+			result = node.winner
+		else:
+			result = randomGame(boards, heights, 3 - node.player, self.state.shape, rng, self.tactical, self.state.n)
+
+		# Backpropagation
+		while node is not None:
+			node.visits += 1
+			if result == node.player:
+				node.wins += 1
+			elif result == 0:
+				node.wins += 0.5
+			node = node.parent
+
+	def bestMove(self):
+		'''
+		The most visited move at the root
+		'''
+		if not self.root.children:
+			return self.root.untried[0]
+		return max(self.root.children, key=lambda child: child.visits).move
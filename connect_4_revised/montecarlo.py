@@ -1,22 +1,86 @@
 import numpy as np
+import os
 import random
+import time
 from players import connect4Player
-from connect4 import connect4
-from copy import deepcopy
+from gamestate import GameState
+from rollout import batchRollouts
+from mcts import uctTree
+from parallel import workerPool
+from threats import forcedColumn
+
+def rolloutTask(state: GameState, player: int, games: int, seed, tactical=False) -> np.ndarray:
+	'''
+	Worker process job for monteCarloAI's 'parallel' mode.
+	Returns wins minus losses for player, indexed by first move.
+	'''
+	wins, losses, _ = batchRollouts(state, player, games, np.random.default_rng(seed), tactical=tactical)
+	return wins - losses
+
+def foldMirrors(vs, symmetric):
+	'''
+	Win counts by first move with the counts of each move and its mirror image added together
+	when the position is its own mirror image, since both moves are then worth the same
+	'''
+	return vs + vs[::-1] if symmetric else vs
 
 class monteCarloAI(connect4Player):
 	'''
 	For each legal first_move, monteCarloAI will simulate many random games
 	starting from that legal move where each player plays random moves until the game is over. 
 	monteCarloAI will keep track of which first_move lead to the most wins and play that move
+
+	mode selects how the random games are played:
+	- 'batch' plays batch_size games at a time in lockstep with NumPy (rollout.batchRollouts)
+	  and keeps going until the time limit is nearly used up
+	- 'flat' plays num_sims games one at a time in Python, or fewer if the time limit
+	  comes first
+	- 'uct' grows a search tree with UCB1 selection (mcts.uctTree) and keeps the part of it
+	  that is still reachable from one move to the next
+	- 'parallel' spreads batches of games over a persistent pool of worker processes
+	  and merges their win counts
+
+	A winning move, or the block of the opponent's winning move, is played right away
+	without any random games. With tactical, the players in the random games do the same.
 	'''
 
-	def play(self, env: connect4, move_dict: dict) -> None:
+	def __init__(self, position, seed=0, CVDMode=False, mode='batch', batch_size=1000, exploration=1.4, workers=None, book=None, endgame=16, tactical=True):
+		super().__init__(position, seed, CVDMode)
+		self.mode = mode
+		self.batch_size = batch_size
+		self.exploration = exploration # UCB1 exploration constant for 'uct'
+		self.workers = workers or os.cpu_count() # number of worker processes for 'parallel'
+		self.num_sims = 1001 # number of random games to play when there is no time limit
+		self.tree = None # uctTree carried over between moves
+		self.book = book # path of an opening book (see makebook.py) to play from before searching
+		self.endgame = endgame # solve positions exactly once this many cells or fewer are empty
+		self.solver = None # endgameSolver, created the first time it is needed
+		self.tactical = tactical # random games win and block when they can
+
+	def usesWorkerPool(self) -> bool:
+		return self.mode == 'parallel'
+
+	def play(self, env: GameState, move_dict: dict) -> None:
+		if self.playForced(env, move_dict):
+			return
+		if self.playBook(env, move_dict, self.book):
+			return
+		if self.playSolved(env, move_dict, self.endgame):
+			return
+		if self.mode == 'batch':
+			self.playBatched(env, move_dict)
+			return
+		if self.mode == 'uct':
+			self.playUCT(env, move_dict)
+			return
+		if self.mode == 'parallel':
+			self.playParallel(env, move_dict)
+			return
 
 		random.seed(self.seed)
 
-		env = deepcopy(env)
-		env.visualize = False
+		symmetric = env.isSymmetric()
+		env = env.toBitboard()
 
 		# Find legal moves
 		# Determine which columns have an empty space and are thus playable
@@ -26,12 +90,16 @@ class monteCarloAI(connect4Player):
 			if p: indices.append(i)
 
 		# Init fitness trackers to track which first_move lead to the most wins
-		vs = np.zeros(7)
+		vs = np.zeros(env.shape[1])
 
 		counter = 0
 
 		# Number of similations to try and run before reaching time limit 
-		num_sims = 1001
+		num_sims = self.num_sims
+
+		# Stop a little before the time limit even if not all of them have been played
+		stopTime = self.searchStopTime(move_dict)
+		moveDeadline = self.moveDeadline(move_dict)
 
 		save_increment = 50
 	
@@ -42,7 +110,7 @@ class monteCarloAI(connect4Player):
 			first_move = random.choice(indices)
 
 			# Play a random game until the game ends
-			turnout = self.playRandomGame(deepcopy(env), first_move)
+			turnout = self.playRandomGame(env, first_move)
 
 			# Track who won the random game
 			if turnout == self.position:
@@ -55,25 +123,129 @@ class monteCarloAI(connect4Player):
 			if counter % save_increment == 0:
 
 				# Best move is the first_move that accumulated the most random wins
-				move_dict['move'] = np.argmax(vs)
+				move_dict['move'] = np.argmax(foldMirrors(vs, symmetric))
+				move_dict['stats'] = {'rollouts': counter}
 			
 			counter += 1
+
+			if time.time() > stopTime or moveDeadline.cancelled:
+				break
 		
-		move_dict['move'] = np.argmax(vs)
+		move_dict['move'] = np.argmax(foldMirrors(vs, symmetric))
+		move_dict['stats'] = {'rollouts': counter}
+
+	def playBatched(self, env: GameState, move_dict: dict) -> None:
+		'''
+		Same search as the flat mode, but the random games are played batch_size at a time
+		'''
+		rng = np.random.default_rng(self.seed)
+		legal = np.array(env.heights) < env.shape[0]
+		symmetric = env.isSymmetric()
+
+		# Stop a little before the time limit. Without a limit, play num_sims games
+		stopTime = self.searchStopTime(move_dict)
+		moveDeadline = self.moveDeadline(move_dict)
+
+		# Init fitness trackers to track which first_move lead to the most wins
+		vs = np.zeros(env.shape[1])
+
+		counter = 0
+		while True:
+			start = time.time()
+			wins, losses, _ = batchRollouts(env, self.position, self.batch_size, rng, tactical=self.tactical)
+			vs += wins - losses
+			counter += self.batch_size
+
+			# Record the best legal move so far after every batch
+			move_dict['move'] = int(np.argmax(np.where(legal, foldMirrors(vs, symmetric), -np.inf)))
+			move_dict['stats'] = {'rollouts': counter}
+
+			if stopTime == np.inf:
+				if counter >= self.num_sims:
+					break
+			# Don't start a batch that would not finish in time
+			elif time.time() + (time.time() - start) > stopTime or moveDeadline.cancelled:
+				break
+
+	def playParallel(self, env: GameState, move_dict: dict) -> None:
+		'''
+		Same search as the batch mode, with the batches played by worker processes.
+
+		Batches are handed out in waves of one per worker. Batch t of the move at ply p is
+		seeded with (seed, p, t) and results are merged in batch order, so for a fixed seed
+		the outcome only depends on how many waves finish before the time limit.
+		'''
+		pool = workerPool(self.workers)
+		legal = np.array(env.heights) < env.shape[0]
+		symmetric = env.isSymmetric()
+		stopTime = self.searchStopTime(move_dict)
+		moveDeadline = self.moveDeadline(move_dict)
+
+		vs = np.zeros(env.shape[1])
+		counter = 0
+		while True:
+			start = time.time()
+			wave = [pool.apply_async(rolloutTask, (env, self.position, self.batch_size, (self.seed, env.ply, counter // self.batch_size + t), self.tactical))
+				for t in range(self.workers)]
+			for result in wave:
+				vs += result.get()
+			counter += self.batch_size * self.workers
+
+			# Record the best legal move so far after every wave
+			move_dict['move'] = int(np.argmax(np.where(legal, foldMirrors(vs, symmetric), -np.inf)))
+			move_dict['stats'] = {'rollouts': counter}
+
+			if stopTime == np.inf:
+				if counter >= self.num_sims:
+					break
+			# Don't start a wave that would not finish in time
+			elif time.time() + (time.time() - start) > stopTime or moveDeadline.cancelled:
+				break
+
+	def playUCT(self, env: GameState, move_dict: dict) -> None:
+		'''
+		Tree search from env, starting from last move's tree if env can be reached from it
+		'''
+		if self.tree is None:
+			self.tree = uctTree(env, self.exploration, random.Random(self.seed), self.tactical)
+		else:
+			self.tree.advance(env)
+
+		stopTime = self.searchStopTime(move_dict)
+		moveDeadline = self.moveDeadline(move_dict)
+		save_increment = 50
+
+		counter = 0
+		while True:
+			self.tree.iterate()
+			counter += 1
+
+			# Every save_increment iterations, record the best move so far
+			# and check whether there is time for more
+			if counter % save_increment == 0:
+				move_dict['move'] = self.tree.bestMove()
+				move_dict['stats'] = {'rollouts': counter}
+				if stopTime == np.inf:
+					if counter >= self.num_sims:
+						break
+				elif time.time() > stopTime or moveDeadline.cancelled:
+					break
 
 	def playRandomGame(self, env, first_move: int):
 		''' 
 		Play a game from the current game state of env where each player 
 		plays random moves until the game it over
 		Return which player won the game
+		env is restored to its starting state before returning
 		'''
 		switch = {1:2,2:1}
 		move = first_move
 		player = self.position
-		self.simulateMove(env, move, player)
+		plies = 1
+		over = env.apply_move(move, player)
 
 		# Play until game is over
-		while not env.gameOver(move, player):
+		while not over:
 			player = switch[player] # switch which player is playing
 
 			# Calculate possible moves
@@ -82,25 +254,21 @@ class monteCarloAI(connect4Player):
 			for i, p in enumerate(possible):
 				if p: indices.append(i)
 			
-			# Select random legal move
-			move = random.choice(indices)
+			# Select random legal move, unless there is a move to win or block with
+			move = forcedColumn(env.boards, player, env.shape, env.n) if self.tactical else -1
+			if move < 0:
+				move = random.choice(indices)
 
 			# Play move
-			self.simulateMove(env, move, player)
+			over = env.apply_move(move, player)
+			plies += 1
 
 		# If the game has a winner return the last player to play
-		if env.is_winner: 
-			return player
-		
 		# Else the game is a tie
-		else: 
-			return 0
+		winner = player if env.is_winner else 0
 
-	def simulateMove(self, env: connect4, move: int, player: int):
-		'''
-		Play the move
-		'''
-		env.board[env.topPosition[move]][move] = player
-		env.topPosition[move] -= 1
-		env.history[0].append(move)
+		# Take back every move of the random game
+		for _ in range(plies):
+			env.undo_move()
 
+		return winner
@@ -0,0 +1,91 @@
+import numpy as np
+import struct
+from bitboard import canonicalKey
+
+'''
+Opening book lookups.
+
+A book file maps positions to the move to play in them. It starts with a 16 byte
+header (magic, version, rows, cols, plies, entry count, pieces in a row needed to win,
+with 0 meaning 4 in books written before it was stored) followed by three arrays of
+the same length: the canonical position keys in increasing order (uint64), the move
+for each key (uint8) and its search value for the player to move (int16).
+
+Keys are bitboard.canonicalKey, so a position and its mirror image share one entry
+and the stored move is flipped back when the mirror image is probed. Books are opened
+with np.memmap: a probe is a binary search that only touches the few pages it reads,
+and nothing is loaded into memory up front. Build books with makebook.py.
+'''
+
+MAGIC = b'C4BK'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBIB3x')
+WIN = 32000 # stored value of a forced win (values are clipped to +/- WIN)
+
+# Books opened in this process, keyed by path, so every player shares one mapping
+books = {}
+
+class openingBook():
+	def __init__(self, path):
+		with open(path, 'rb') as f:
+			magic, version, rows, cols, plies, count, n = HEADER.unpack(f.read(HEADER.size))
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a version {VERSION} opening book")
+		self.shape = (rows, cols)
+		self.n = n or 4
+		self.plies = plies # positions with up to this many pieces are in the book
+		self.count = count
+
+		# Empty arrays can't be memory-mapped
+		if count == 0:
+			self.keys = np.zeros(0, dtype='<u8')
+			self.moves = np.zeros(0, dtype=np.uint8)
+			self.values = np.zeros(0, dtype='<i2')
+			return
+		offset = HEADER.size
+		self.keys = np.memmap(path, dtype='<u8', mode='r', offset=offset, shape=(count,))
+		offset += 8 * count
+		self.moves = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(count,))
+		offset += count
+		self.values = np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(count,))
+
+	def __len__(self):
+		return self.count
+
+	def probe(self, state):
+		'''
+		(move, value) for a GameState, or None if it isn't in the book
+		'''
+		if tuple(state.shape) != self.shape or state.n != self.n or state.ply > self.plies:
+			return None
+		key, mirrored = canonicalKey(state.boards, state.shape)
+		i = int(np.searchsorted(self.keys, np.uint64(key)))
+		if i == self.count or int(self.keys[i]) != key:
+			return None
+		move = int(self.moves[i])
+		if mirrored:
+			move = self.shape[1] - 1 - move
+		return move, int(self.values[i])
+
+def openBook(path):
+	'''
+	The opening book at path, opened the first time it is asked for
+	'''
+	if path not in books:
+		books[path] = openingBook(path)
+	return books[path]
+
+def writeBook(path, board_shape, plies, entries, n=4):
+	'''
+	Write a book file from (key, move, value) entries with canonical keys
+	'''
+	entries = sorted(entries)
+	keys = np.array([key for key, _, _ in entries], dtype='<u8')
+	moves = np.array([move for _, move, _ in entries], dtype=np.uint8)
+	values = np.clip([value for _, _, value in entries], -WIN, WIN).astype('<i2')
+	with open(path, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, VERSION, board_shape[0], board_shape[1], plies, len(entries), n))
+		f.write(keys.tobytes())
+		f.write(moves.tobytes())
+		f.write(values.tobytes())
+	books.pop(path, None) # reopen it if it was already open
@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+import signal
+
+# Worker pools kept alive for the life of the process, keyed by number of workers
+pools = {}
+
+def initWorker():
+	'''
+	Forked workers inherit pygame/SDL's SIGTERM handler, which would stop
+	Pool.terminate from shutting them down when the parent exits
+	'''
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is handled by the parent
+
+def workerPool(workers=None):
+	'''
+	Persistent process pool shared by every player in this process.
+	Created the first time it is asked for, so players that never search in parallel
+	never start any processes.
+	'''
+	workers = workers or os.cpu_count()
+	if workers not in pools:
+		pools[workers] = multiprocessing.Pool(workers, initializer=initWorker)
+	return pools[workers]
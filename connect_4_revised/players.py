@@ -1,35 +1,116 @@
 import numpy as np
 import random
-import pygame
-import math
-from connect4 import connect4
-import sys
-import copy
-import time
+from gamestate import GameState
+from deadline import deadline, searchTimeout
+from parallel import workerPool
+from transposition import transpositionTable
+from search import searchCore, WIN_SCORE
+from renderer import display
+from openingbook import openBook
+from solver import endgameSolver
+from threats import forcedMove, safeMoves
+import os
 
 class connect4Player(object):
+	needsDisplay = False # does the player need the game window to pick its moves
+
 	def __init__(self, position, seed=0, CVDMode=False):
 		self.position = position
 		self.opponent = None
 		self.seed = seed
+		self.CVDMode = CVDMode
 		random.seed(seed)
-		if CVDMode:
-			global P1COLOR
-			global P2COLOR
-			P1COLOR = (227, 60, 239)
-			P2COLOR = (0, 255, 0)
 
-	def play(self, env: connect4, move_dict: dict) -> None:
+	def play(self, env: GameState, move_dict: dict) -> None:
 		move_dict["move"] = -1
 
+	def moveDeadline(self, move_dict: dict):
+		'''
+		The move's deadline, or one without a limit if there is none. Searches stop once it
+		is cancelled (see enforcement.cooperativeEnforcer) as well as at their stopTime.
+		'''
+		return move_dict["deadline"] if "deadline" in move_dict else deadline()
+
+	def searchStopTime(self, move_dict: dict, fraction=0.9):
+		'''
+		Absolute time a search should stop at to get its move in before the deadline
+		(inf if there is no limit), see deadline.stopTime
+		'''
+		return self.moveDeadline(move_dict).stopTime(fraction)
+
+	def usesWorkerPool(self) -> bool:
+		'''
+		Does the player search with a pool of worker processes? Such players can't be run
+		inside a daemonic process (the 'process' enforcement or a tournament's pool)
+		'''
+		return False
+
+	def distinctColumns(self, env, columns) -> list:
+		'''
+		columns without the mirror images of earlier ones when the position is its own
+		mirror image, since a move and its mirror image are then worth the same
+		'''
+		if not env.isSymmetric():
+			return columns
+		cols = env.shape[1]
+		distinct = []
+		for col in columns:
+			if cols-1 - col not in distinct:
+				distinct.append(col)
+		return distinct
+
+	def playForced(self, env: GameState, move_dict: dict) -> bool:
+		'''
+		Play a winning move, or block the opponent's winning move, if there is one.
+		Returns True if a move was played.
+		'''
+		column = forcedMove(env)
+		if column < 0:
+			return False
+		move_dict["move"] = column
+		move_dict["stats"] = {'forced': True}
+		return True
+
+	def playBook(self, env: GameState, move_dict: dict, path) -> bool:
+		'''
+		Play the opening book's move for this position if it has one (path None means no book).
+		Returns True if a move was played from the book.
+		'''
+		if path is None:
+			return False
+		entry = openBook(path).probe(env)
+		if entry is None:
+			return False
+		move_dict["move"] = entry[0]
+		move_dict["stats"] = {'book': True}
+		return True
+
+	def playSolved(self, env: GameState, move_dict: dict, emptyCells, fraction=0.5) -> bool:
+		'''
+		Play the best move found by the exact endgame solver if the board has at most
+		emptyCells empty cells. The solver gets fraction of the time left, and if it can't
+		finish in that time nothing is played. Returns True if a move was played.
+		'''
+		if env.shape[0] * env.shape[1] - env.ply > emptyCells:
+			return False
+		if getattr(self, 'solver', None) is None or (self.solver.shape, self.solver.n) != (env.shape, env.n):
+			self.solver = endgameSolver(env.shape, n=env.n)
+		stopTime = self.searchStopTime(move_dict, fraction)
+		try:
+			_, move_dict["move"] = self.solver.solve(env, stopTime, self.moveDeadline(move_dict))
+		except searchTimeout:
+			return False
+		move_dict["stats"] = {'solved': True, 'nodes': self.solver.nodes}
+		return True
+
 class humanConsole(connect4Player):
 	'''
 	Human player where input is collected from the console
 	'''
-	def play(self, env: connect4, move_dict: dict) -> None:
+	def play(self, env: GameState, move_dict: dict) -> None:
 		move_dict['move'] = int(input('Select next move: '))
 		while True:
-			if int(move_dict['move']) >= 0 and int(move_dict['move']) <= 6 and env.topPosition[int(move_dict['move'])] >= 0:
+			if int(move_dict['move']) >= 0 and int(move_dict['move']) < env.shape[1] and env.topPosition[int(move_dict['move'])] >= 0:
 				break
 			move_dict['move'] = int(input('Index invalid. Select next move: '))
 
@@ -37,40 +118,22 @@ class humanGUI(connect4Player):
 	'''
 	Human player where input is collected from the GUI
 	'''
+	needsDisplay = True
 
-	def play(self, env: connect4, move_dict: dict) -> None:
-		done = False
-		while(not done):
-			for event in pygame.event.get():
-				if event.type == pygame.QUIT:
-					sys.exit()
-
-				if event.type == pygame.MOUSEMOTION:
-					pygame.draw.rect(screen, BLACK, (0,0, width, SQUARESIZE))
-					posx = event.pos[0]
-					if self.position == 1:
-						pygame.draw.circle(screen, P1COLOR, (posx, int(SQUARESIZE/2)), RADIUS)
-					else: 
-						pygame.draw.circle(screen, P2COLOR, (posx, int(SQUARESIZE/2)), RADIUS)
-				pygame.display.update()
-
-				if event.type == pygame.MOUSEBUTTONDOWN:
-					posx = event.pos[0]
-					col = int(math.floor(posx/SQUARESIZE))
-					move_dict['move'] = col
-					done = True
+	def play(self, env: GameState, move_dict: dict) -> None:
+		move_dict['move'] = display(env.shape, self.CVDMode).selectColumn(self.position)
 
 class randomAI(connect4Player):
 	'''
-	connect4Player that elects a random playable column as its move
+	connect4Player that elects a random playable column as its move.
+	It takes a win and blocks a loss when it sees one, and otherwise avoids moves that
+	let the opponent win.
 	'''
 
-	def play(self, env: connect4, move_dict: dict) -> None:
-		possible = env.topPosition >= 0
-		indices = []
-		for i, p in enumerate(possible):
-			if p: indices.append(i)
-		move_dict['move'] = random.choice(indices)
+	def play(self, env: GameState, move_dict: dict) -> None:
+		if self.playForced(env, move_dict):
+			return
+		move_dict['move'] = random.choice(safeMoves(env))
 
 class stupidAI(connect4Player):
 	'''
@@ -79,7 +142,7 @@ class stupidAI(connect4Player):
 	'''
 
 
-	def play(self, env: connect4, move_dict: dict) -> None:
+	def play(self, env: GameState, move_dict: dict) -> None:
 		possible = env.topPosition >= 0
 		indices = []
 		for i, p in enumerate(possible):
@@ -97,308 +160,166 @@ class stupidAI(connect4Player):
 		else:
 			move_dict['move'] = 0
 
-class minimaxAI(connect4Player):
+class minimaxAI(connect4Player, searchCore):
 	'''
 	This is where you will design a connect4Player that 
 	implements the minimiax algorithm WITHOUT alpha-beta pruning
-	'''
-
-	def evaluationFunction(self, env: connect4) -> int:
-		player = self.position
-		opponent = 3 - player
-		score = 0
-
-		# Check all possible 4-in-a-row sequences
-		for row in range(env.shape[0]):
-			for col in range(env.shape[1]):
-				# horizontal
-				if col + 3 < env.shape[1]:
-					window = [env.board[row][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# vertical
-				if row + 3 < env.shape[0]:
-					window = [env.board[row + i][col] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# diagonal ascending
-				if row + 3 < env.shape[0] and col + 3 < env.shape[1]:
-					window = [env.board[row + i][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# diagonal descending
-				if row - 3 >= 0 and col + 3 < env.shape[1]:
-					window = [env.board[row - i][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-		return score
-
-	def computeScore(self, window, player, opponent):
-		score = 0
-		if window.count(player) == 4:
-			score += 1000  # Immediate win
-		elif window.count(player) == 3 and window.count(0) == 1:
-			score += 100  # Potential win in next move
-		elif window.count(player) == 2 and window.count(0) == 2:
-			score += 10   # Potential to build a threat
-
-		if window.count(opponent) == 3 and window.count(0) == 1:
-			score -= 200  # Block opponent's immediate win
-		elif window.count(opponent) == 2 and window.count(0) == 2:
-			score -= 20   # Block opponent's potential threat
-
-		return score
-
-	def simulateMove(self, env: connect4, column):
-		if env.topPosition[column] >= 0:
-			env.board[env.topPosition[column]][column] = self.position
-			env.topPosition[column] -= 1
-	
-	def MAX(self, env: connect4, depth, move_dict: dict):
-		player = env.turnPlayer.position 
-		move = env.playTurn()
-		if env.gameOver(move, player):
-			return -np.inf
-		if depth == 0:
-			return self.evaluationFunction(env)
-		
-		possible = env.topPosition >= 0 
-		indices = []
-		for i, p in enumerate(possible):
-			if p: indices.append(i)
-		
-		value = -np.inf
-		for column in indices:
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column)
-			value = max(value, self.MIN(envCopy, depth-1, move_dict))
-			
-		return value
-		
-	def MIN(self, env: connect4, depth, move_dict: dict):
-		player = env.turnPlayer.position 
-		move = env.playTurn()
-		if env.gameOver(move, player):
-			return np.inf
-		if depth == 0:
-			return self.evaluationFunction(env)
-		
-		possible = env.topPosition >= 0 
-		indices = []
-		for i, p in enumerate(possible):
-			if p: indices.append(i)
 
-		value = np.inf
-		for column in indices:
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column, self.position)
-			value = max(value, self.MAX(envCopy, depth-1, move_dict))
-
-		return value
-
-
-	def play(self, env: connect4, move_dict: dict) -> None:
-		bestValue = -np.inf
-		bestMove = None
-		maxDepth = 2
-
-		possible = env.topPosition >= 0 
-		indices = []
-		for i, p in enumerate(possible):
-			if p: indices.append(i)
+	The search core's MAX/MIN with pruning turned off and no transposition table, so
+	every position down to maxDepth is searched and counted
+	'''
 
-		for column in indices:
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column)
-			value = self.MAX(env, maxDepth)
+	def __init__(self, position, seed=0, CVDMode=False, evaluation=None):
+		super().__init__(position, seed, CVDMode)
+		self.initSearch(evaluation, pruning=False)
+		self.maxDepth = 2 # plies searched below each root move
+
+	def play(self, env: GameState, move_dict: dict) -> None:
+		env = env.toBitboard()
+		env.attachEvaluator()
+		self.stopTime = self.searchStopTime(move_dict)
+		self.deadline = self.moveDeadline(move_dict)
+		self.resetCounters()
+
+		columns = self.distinctColumns(env, self.orderColumns(env, -1, self.position))
+		move_dict["move"] = columns[0]
+		try:
+			_, move_dict["move"] = self.searchRoot(env, self.maxDepth, columns, move_dict)
+		except searchTimeout:
+			pass
+		move_dict["stats"] = {'nodes': self.nodes, 'depth': self.maxDepth + 1}
+
+class alphaBetaAI(connect4Player, searchCore):
+
+	def __init__(self, position, seed=0, CVDMode=False, tt_size=16, tt_replace='depth', workers=1, book=None, endgame=16, search='alphabeta', aspiration=25, evaluation=None):
+		super().__init__(position, seed, CVDMode)
+		self.maxDepth = 3  # Start with a shallow depth
+		self.book = book # path of an opening book (see makebook.py) to play from before searching
+		self.endgame = endgame # solve positions exactly once this many cells or fewer are empty
+		self.solver = None # endgameSolver, created the first time it is needed
+
+		# Transposition table shared by every search this player runs.
+		# tt_size is its memory cap in MB, tt_replace is 'depth' or 'always'
+		self.initSearch(evaluation, pruning=True, tt=transpositionTable(tt_size, tt_replace), search=search, aspiration=aspiration)
+		self.tt_options = (tt_size, tt_replace)
+
+		# With more than one worker, root moves are split across worker processes
+		self.workers = workers or os.cpu_count()
+
+	def usesWorkerPool(self) -> bool:
+		return self.workers > 1
+
+	def searchRootParallel(self, state: GameState, depth, columns):
+		'''
+		Same result as searchRoot, with the root moves searched by worker processes.
+		The first (most promising) move is searched on its own, then the rest are searched
+		in parallel with its value as alpha, so they can still be pruned against it.
+		'''
+		pool = workerPool(self.workers)
+		args = (self.position, state, depth, self.stopTime, self.tt_options, self.search)
+		first = pool.apply(searchMoveTask, (columns[0], -np.inf) + args)
+		if first is None:
+			raise searchTimeout()
+		self.countWorkerStats(first[1])
+		bestValue, bestMove = first[0], columns[0]
+
+		results = [pool.apply_async(searchMoveTask, (column, bestValue) + args) for column in columns[1:]]
+		results = [result.get() for result in results]
+		if None in results:
+			raise searchTimeout()
+		for result in results:
+			self.countWorkerStats(result[1])
+		for column, (value, _) in zip(columns[1:], results):
 			if value > bestValue:
 				bestValue = value
 				bestMove = column
-		move_dict["move"] = bestMove
-		print("I finished")
-
-class alphaBetaAI(connect4Player):
-
-	global value 
-	
-	value = [
-		[3,4,5,7,5,4,3],
-		[4,6,8,10,8,6,4],
-		[5,8,11,13,11,8,5],
-		[5,8,11,13,11,8,5],
-		[4,6,8,10,8,6,4],
-		[3,4,5,7,5,4,3],
-	]
-
-	def __init__(self, position, seed=0, CVDMode=False):
-		super().__init__(position, seed, CVDMode)
-		self.maxDepth = 3  # Start with a shallow depth
-
-	def evaluationFunction(self, env: connect4) -> int:
-		player = self.position
-		opponent = 3 - player
-		score = 0
-
-		# Check all possible 4-in-a-row sequences
-		for row in range(env.shape[0]):
-			for col in range(env.shape[1]):
-				# horizontal
-				if col + 3 < env.shape[1]:
-					window = [env.board[row][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# vertical
-				if row + 3 < env.shape[0]:
-					window = [env.board[row + i][col] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# diagonal ascending
-				if row + 3 < env.shape[0] and col + 3 < env.shape[1]:
-					window = [env.board[row + i][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-				# diagonal descending
-				if row - 3 >= 0 and col + 3 < env.shape[1]:
-					window = [env.board[row - i][col + i] for i in range(4)]
-					score += self.computeScore(window, player, opponent)
-
-		return score
-
-	def computeScore(self, window, player, opponent):
-		score = 0
-		if window.count(player) == 4:
-			score += 1000  # Immediate win
-		elif window.count(player) == 3 and window.count(0) == 1:
-			score += 100  # Potential win in next move
-		elif window.count(player) == 2 and window.count(0) == 2:
-			score += 10   # Potential to build a threat
-
-		if window.count(opponent) == 3 and window.count(0) == 1:
-			score -= 200  # Block opponent's immediate win
-		elif window.count(opponent) == 2 and window.count(0) == 2:
-			score -= 20   # Block opponent's potential threat
-
-		return score
-
-	def sortColumnsByValue(self, env: connect4) -> list:
-		"""
-		Sorts columns based on the sum of the positional weights of empty spaces in each column.
-		Columns with higher sums are prioritized.
-		"""
-		column_scores = []
-
-		for col in range(env.shape[1]):
-			if env.topPosition[col] >= 0:  
-				row = env.topPosition[col]  
-				score = value[row][col]  
-				column_scores.append((col, score)) 
-
-		# Sort columns by their scores in descending order
-		column_scores.sort(key=lambda x: x[1], reverse=True)
-
-		# Return only the column indices (sorted)
-		return [col for col, score in column_scores]
-
-
-	def simulateMove(self, env: connect4, column):
-		if env.topPosition[column] >= 0:
-			env.board[env.topPosition[column]][column] = self.position
-			env.topPosition[column] -= 1
-
-	def MAX(self, env: connect4, depth, alpha, beta, move_dict: dict):
-		if env.gameOver(move_dict["move"], 3 - self.position):
-			return -np.inf
-		if depth == 0:
-			return self.evaluationFunction(env)
-		
-		""" possible = env.topPosition >= 0 # which columns have empty spaces
-		indices = []
-		for i, p in enumerate(possible):
-			if p: indices.append(i) """
-
-		sortedColumns = self.sortColumnsByValue(env)
-		
-		value = -np.inf
-		for column in sortedColumns:
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column)
-				
-			value = max(value, self.MIN(envCopy, depth-1, alpha, beta, move_dict))
-			if value >= beta: return value
-			alpha = max(alpha, value)
-			
-		return value
-		
-	def MIN(self, env: connect4, depth, alpha, beta, move_dict: dict):
-		if env.gameOver(move_dict["move"], 3 - self.position):
-			return np.inf
-		if depth == 0:
-			return self.evaluationFunction(env)
-		
-		""" possible = env.topPosition >= 0 # which columns have empty spaces
-		indices = [] 
-		for i, p in enumerate(possible):
-			if p: indices.append(i) """
-
-		sortedColumns = self.sortColumnsByValue(env)
-
-		value = np.inf
-		for column in sortedColumns:
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column)
-				
-			value = min(value, self.MAX(envCopy, depth-1, alpha, beta, move_dict))
-			if value <= alpha: return value
-			beta = min(beta, value)
-
-		return value
+		return bestValue, bestMove
 
+	def countWorkerStats(self, stats):
+		nodes, cutoffs, ttHits = stats
+		self.nodes += nodes
+		self.cutoffs += cutoffs
+		self.ttHits += ttHits
 
-	def play(self, env: connect4, move_dict: dict) -> None:
-		_, count = np.unique(env.board, return_counts=True)
-		if count[0] == env.shape[0] * env.shape[1]:
+	def play(self, env: GameState, move_dict: dict) -> None:
+		if self.playForced(env, move_dict):
+			return
+		if self.playBook(env, move_dict, self.book):
+			return
+		if env.ply == 0:
 			move_dict["move"] = env.shape[1] // 2
 			return
-		bestMove = 3  
-		maxDepth = 0  
-
-		bestValue = -np.inf
-		for column in self.sortColumnsByValue(env):
-			envCopy = copy.deepcopy(env)
-			self.simulateMove(envCopy, column)
-			if envCopy.topPosition[column] >= 0:
-				move_dict['move'] = column
-				value = self.MAX(envCopy, maxDepth, -np.inf, np.inf, move_dict)
-				if value > bestValue:
-					bestValue = value
-					bestMove = column
-		maxDepth += 1  
-
-		move_dict["move"] = bestMove
-
-# Defining Constants
-SQUARESIZE = 100
-BLUE = (0,0,255)
-BLACK = (0,0,0)
-P1COLOR = (255,0,0)
-P2COLOR = (255,255,0)
-
-ROW_COUNT = 6
-COLUMN_COUNT = 7
-
-pygame.init()
-
-SQUARESIZE = 100
-
-width = COLUMN_COUNT * SQUARESIZE
-height = (ROW_COUNT+1) * SQUARESIZE
-
-size = (width, height)
-
-RADIUS = int(SQUARESIZE/2 - 5)
-
-screen = pygame.display.set_mode(size)
-
-
+		if self.playSolved(env, move_dict, self.endgame):
+			return
+		state = env
+		env = env.toBitboard()
+		env.attachEvaluator()
+
+		# Stop searching a little before the time limit so the move is in before
+		# connect4 gives up on us. Without a limit, search to self.maxDepth
+		self.stopTime = self.searchStopTime(move_dict)
+		self.deadline = self.moveDeadline(move_dict)
+		if self.stopTime == np.inf:
+			lastDepth = self.maxDepth
+		else:
+			lastDepth = env.shape[0] * env.shape[1] - env.moves - 1
+
+		# Iterative deepening: after each completed depth, publish its best move
+		# and try it first at the next depth
+		self.resetCounters()
+		self.ageHistory()
+		safe = safeMoves(state) # don't bother searching moves that let the opponent win
+		columns = [c for c in self.distinctColumns(env, self.sortColumnsByValue(env)) if c in safe]
+		move_dict["move"] = columns[0] # in case not even the first depth finishes in time
+		scores = [] # score of every completed depth, for the 'pvs' aspiration windows
+		for maxDepth in range(lastDepth + 1):
+			try:
+				if self.workers > 1:
+					bestValue, bestMove = self.searchRootParallel(state, maxDepth, columns)
+				elif self.search == 'pvs':
+					guess = scores[-2] if len(scores) >= 2 else None
+					bestValue, bestMove = self.searchRootAspiration(env, maxDepth, columns, guess)
+				else:
+					bestValue, bestMove = self.searchRoot(env, maxDepth, columns, move_dict)
+			except searchTimeout:
+				break
+			move_dict["move"] = bestMove
+			move_dict["stats"] = {'nodes': self.nodes, 'depth': maxDepth + 1, 'cutoffs': self.cutoffs, 'tt_hits': self.ttHits}
+			scores.append(bestValue)
+			columns.remove(bestMove)
+			columns.insert(0, bestMove)
+
+			# A forced win or loss will not change with more depth
+			if abs(bestValue) >= WIN_SCORE - env.shape[0] * env.shape[1]:
+				break
 
+# alphaBetaAI searchers living in this (worker) process, one per player position,
+# so each worker keeps its own transposition table from one task to the next
+workerSearchers = {}
 
+def searchMoveTask(column, alpha, position, state, depth, stopTime, tt_options, search='alphabeta'):
+	'''
+	Worker process job for alphaBetaAI's parallel root search: the value of playing
+	column in state, searched to depth with window (alpha, inf), or None if it ran out of time.
+	Returned with the (nodes, cutoffs, tt hits) of the search.
+	'''
+	searcher = workerSearchers.get(position)
+	if searcher is None or searcher.tt_options != tt_options or searcher.search != search:
+		workerSearchers[position] = alphaBetaAI(position, tt_size=tt_options[0], tt_replace=tt_options[1], search=search)
+	searcher = workerSearchers[position]
+	searcher.stopTime = stopTime
+	searcher.resetCounters()
+
+	env = state.toBitboard()
+	env.attachEvaluator()
+	try:
+		if env.apply_move(column, position):
+			win = WIN_SCORE - env.moves if search == 'pvs' else np.inf
+			value = win if env.is_winner else 0
+		elif search == 'pvs':
+			value = -searcher.negamax(env, depth, -np.inf, -alpha, 3 - position)
+		else:
+			value = searcher.MIN(env, depth, alpha, np.inf, {})
+		return value, (searcher.nodes, searcher.cutoffs, searcher.ttHits)
+	except searchTimeout:
+		return None
@@ -0,0 +1,138 @@
+import atexit
+import os
+import struct
+import numpy as np
+
+'''
+Binary game records.
+
+A record file is a sequence of self-contained game records, so any number of processes
+can append to the same file and a reader never needs anything but the records themselves.
+Each record is a fixed header followed by its variable-length parts (little-endian):
+- magic b'C4G2', length of the rest of the record (uint32), game number (uint32)
+- rows, cols, pieces in a row needed to win, winner (0 for a tie), length of each
+  player's name (uint8 each)
+- number of moves (uint16), player1's seed, player2's seed (int64 each)
+- the two player names (utf-8), the moves in the order they were played (uint8 each)
+  and the seconds each move took (float32 each)
+
+gameWriter buffers records in memory and appends them with a single write on a file
+opened in append mode, so records written by different processes never interleave.
+readGames iterates over a file one record at a time as dicts. It also reads b'C4G1'
+records, which are the same without the win length and are always connect 4.
+'''
+
+MAGIC = b'C4G2'
+HEADER = struct.Struct('<4sIIBBBBBBHqq')
+HEADERS = {MAGIC: HEADER, b'C4G1': struct.Struct('<4sIIBBBBBHqq')}
+
+def encodeGame(game):
+	'''
+	Bytes of one record from a dict with the same keys readGames yields
+	'''
+	names = [name.encode('utf-8')[:255] for name in game['players']]
+	moves = np.asarray(game['moves'], dtype=np.uint8)
+	times = np.asarray(game['times'], dtype='<f4')
+	body = names[0] + names[1] + moves.tobytes() + times.tobytes()
+	header = HEADER.pack(MAGIC, HEADER.size - 8 + len(body), game['game'], game['shape'][0], game['shape'][1],
+		game.get('n', 4), game['winner'], len(names[0]), len(names[1]), len(moves), game['seeds'][0], game['seeds'][1])
+	return header + body
+
+def decodeGame(header, body):
+	if header[:4] == MAGIC:
+		magic, _, number, rows, cols, n, winner, len1, len2, count, seed1, seed2 = HEADER.unpack(header)
+	else:
+		magic, _, number, rows, cols, winner, len1, len2, count, seed1, seed2 = HEADERS[header[:4]].unpack(header)
+		n = 4
+	moves = np.frombuffer(body, dtype=np.uint8, count=count, offset=len1+len2)
+	times = np.frombuffer(body, dtype='<f4', count=count, offset=len1+len2+count)
+	return {
+		'game': number,
+		'shape': (rows, cols),
+		'n': n,
+		'players': (body[:len1].decode('utf-8'), body[len1:len1+len2].decode('utf-8')),
+		'seeds': (seed1, seed2),
+		'moves': moves.tolist(),
+		'times': times.tolist(),
+		'winner': winner}
+
+class gameWriter():
+	'''
+	Appends game records to path, holding up to buffer_size bytes before writing them out
+	'''
+	def __init__(self, path, buffer_size=1<<16):
+		self.path = path
+		self.buffer_size = buffer_size
+		self.buffer = bytearray()
+		self.fd = None
+		self.pid = None
+
+	def open(self):
+		directory = os.path.dirname(self.path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		self.pid = os.getpid()
+
+	def write(self, game):
+		if self.pid != os.getpid():
+			# A forked child gets a copy of its parent's writer: the parent still owns the
+			# records it buffered, so start over with an empty buffer and our own descriptor
+			self.buffer = bytearray()
+			self.open()
+		self.buffer += encodeGame(game)
+		if len(self.buffer) >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		if self.buffer and self.pid == os.getpid():
+			os.write(self.fd, bytes(self.buffer)) # one append, so whole records land together
+			self.buffer = bytearray()
+
+	def close(self):
+		self.flush()
+		if self.fd is not None and self.pid == os.getpid():
+			os.close(self.fd)
+		self.fd = None
+		self.pid = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+# Writers used by this process, keyed by path, flushed when the process exits
+writers = {}
+
+def openWriter(path):
+	'''
+	The shared gameWriter for path, created the first time it is asked for
+	'''
+	if path not in writers:
+		writers[path] = gameWriter(path)
+	return writers[path]
+
+def flushWriters():
+	for writer in writers.values():
+		writer.flush()
+
+atexit.register(flushWriters)
+
+def readGames(path):
+	'''
+	Iterate over the games in a record file. Stops at a truncated last record.
+	'''
+	with open(path, 'rb') as f:
+		while True:
+			prefix = f.read(8)
+			if len(prefix) < 8:
+				return
+			if prefix[:4] not in HEADERS:
+				raise ValueError(f"{path} has a corrupt game record at byte {f.tell() - len(prefix)}")
+			length = struct.unpack_from('<I', prefix, 4)[0]
+			record = f.read(length)
+			if len(record) < length:
+				return
+			size = HEADERS[prefix[:4]].size - 8
+			yield decodeGame(prefix + record[:size], record[size:])
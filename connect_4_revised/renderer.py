@@ -0,0 +1,114 @@
+import math
+import sys
+
+'''
+Drawing the game is kept out of the game engine so that headless games (tests,
+tournaments, worker processes) never import pygame or open a window.
+
+connect4 draws through a renderer. The base renderer draws nothing; pygameRenderer
+imports and starts pygame the first time one is created, which connect4 only does when
+visualize is on or a player needs the window (humanGUI).
+'''
+
+class renderer():
+	'''
+	Renderer interface. Every method is a no-op, so this is also the headless renderer.
+	'''
+	def drawBoard(self, board):
+		'''
+		Draw a (rows, cols) board array
+		'''
+		pass
+
+	def drawWinLine(self, start, end):
+		'''
+		Draw a line through a win from the (row, col) cell start to the cell end
+		'''
+		pass
+
+	def pollEvents(self):
+		'''
+		Handle pending window events, exiting if the window was closed
+		'''
+		pass
+
+'''Pygame code used with permission from Keith Galli.
+Refer to https://github.com/KeithGalli/Connect4-Python for licensing'''
+
+SQUARESIZE = 100
+RADIUS = int(SQUARESIZE/2 - 5)
+BLUE = (0,0,255)
+BLACK = (0,0,0)
+WHITE = (255,255,255)
+COLORS = ((255,0,0), (255,255,0)) # player1, player2
+CVD_COLORS = ((227, 60, 239), (0, 255, 0)) # colorblind-friendly palette
+
+active = None # the pygameRenderer that owns the window, if one has been opened
+
+class pygameRenderer(renderer):
+	def __init__(self, board_shape=(6,7), CVDMode=False):
+		global active, pygame
+		import pygame
+
+		self.shape = board_shape
+		self.colors = CVD_COLORS if CVDMode else COLORS
+		self.width = board_shape[1] * SQUARESIZE
+		self.height = (board_shape[0]+1) * SQUARESIZE # extra row on top for the piece being dropped
+
+		pygame.init()
+		self.screen = pygame.display.set_mode((self.width, self.height))
+		active = self
+
+	def center(self, cell):
+		row, col = cell
+		return (int(col*SQUARESIZE+SQUARESIZE/2), int(row*SQUARESIZE+SQUARESIZE+SQUARESIZE/2))
+
+	def drawBoard(self, board):
+		rows, cols = self.shape
+		for c in range(cols):
+			for r in range(rows):
+				pygame.draw.rect(self.screen, BLUE, (c*SQUARESIZE, r*SQUARESIZE+SQUARESIZE, SQUARESIZE, SQUARESIZE))
+				pygame.draw.circle(self.screen, BLACK, self.center((r, c)), RADIUS)
+
+		for c in range(cols):
+			for r in range(rows):
+				if board[r][c] == 1:
+					pygame.draw.circle(self.screen, self.colors[0], (int((c)*SQUARESIZE+SQUARESIZE/2), self.height-int((rows-1-r)*SQUARESIZE+SQUARESIZE/2)), RADIUS)
+				elif board[r][c] == 2:
+					pygame.draw.circle(self.screen, self.colors[1], (int((c)*SQUARESIZE+SQUARESIZE/2), self.height-int((rows-1-r)*SQUARESIZE+SQUARESIZE/2)), RADIUS)
+		pygame.display.update()
+
+	def drawWinLine(self, start, end):
+		pygame.draw.line(self.screen, WHITE, self.center(start), self.center(end), 5)
+		pygame.display.update()
+
+	def pollEvents(self):
+		for event in pygame.event.get():
+			if event.type == pygame.QUIT:
+				pygame.quit()
+				sys.exit()
+
+	def selectColumn(self, player):
+		'''
+		Wait for player to click a column and return it
+		'''
+		while True:
+			for event in pygame.event.get():
+				if event.type == pygame.QUIT:
+					sys.exit()
+
+				if event.type == pygame.MOUSEMOTION:
+					pygame.draw.rect(self.screen, BLACK, (0,0, self.width, SQUARESIZE))
+					posx = event.pos[0]
+					pygame.draw.circle(self.screen, self.colors[player-1], (posx, int(SQUARESIZE/2)), RADIUS)
+				pygame.display.update()
+
+				if event.type == pygame.MOUSEBUTTONDOWN:
+					posx = event.pos[0]
+					return int(math.floor(posx/SQUARESIZE))
+
+def display(board_shape=(6,7), CVDMode=False):
+	'''
+	The open pygame window, opening one if there isn't one yet
+	'''
+	return active if active is not None else pygameRenderer(board_shape, CVDMode)
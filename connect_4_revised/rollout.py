@@ -0,0 +1,172 @@
+import numpy as np
+from functools import lru_cache
+from evaluation import windowIndices
+from bitboard import connected
+from threats import shapeMasks, winningCells
+
+'''
+Vectorized random playouts.
+
+Instead of playing one random game at a time, batchRollouts advances thousands of
+independent games in lockstep: every ply picks a random legal column for all unfinished
+games at once with a masked argmax, drops the pieces and checks all the games for a win
+with array operations.
+
+Boards whose bitboard fits in 64 bits (6x7 needs 49) are stored as two uint64 bitboards
+per game and checked with the same shift-and-mask test as bitboard.isWin. Larger boards
+fall back to a (games, cells) array and only check the windows through each new piece.
+
+randomGame is the one-game-at-a-time version on plain Python ints, for callers that need
+a single playout (e.g. from a leaf of a search tree).
+
+With tactical=True the players of the random games take a winning move when they have one
+and otherwise block the opponent's winning move (threats.forcedColumn), and only play at
+random when neither exists. The batched version only does this on boards that fit in 64
+bits, and never on the first move, whose statistics are what the games are played for.
+'''
+
+@lru_cache(maxsize=None)
+def rolloutTables(board_shape, n=4):
+	'''
+	Returns (windows, cellWindows) for the array fallback:
+	- windows: (W+1, n) flat cell indices of every window, plus a last dummy window made
+	  of the extra always-empty cell rows*cols that can never be a win
+	- cellWindows: (rows*cols, K) indices into windows of the windows through each cell,
+	  padded with the dummy window
+	'''
+	rows, cols = board_shape
+	windows = windowIndices(board_shape, n)
+	dummy = len(windows)
+	windows = np.vstack([windows, np.full((1, n), rows*cols, dtype=np.intp)])
+
+	byCell = [[] for _ in range(rows*cols)]
+	for w, cells in enumerate(windows[:dummy].tolist()):
+		for cell in cells:
+			byCell[cell].append(w)
+	K = max([len(ws) for ws in byCell] + [1])
+	cellWindows = np.full((rows*cols, K), dummy, dtype=np.intp)
+	for cell, ws in enumerate(byCell):
+		cellWindows[cell, :len(ws)] = ws
+	return windows, cellWindows
+
+def batchRollouts(state, player, games, rng, n=None, tactical=False):
+	'''
+	Play `games` random games to the end from a GameState.
+
+	player - whose wins and losses are counted
+	rng - np.random.Generator used to pick moves
+	n - pieces in a row needed to win (default state.n)
+	tactical - win and block when possible instead of always moving at random
+
+	Returns (wins, losses, plays), arrays indexed by the first move of the random games.
+	'''
+	n = state.n if n is None else n
+	rows, cols = state.shape
+	tops = np.tile(np.asarray(state.heights, dtype=np.intp), (games, 1))
+	pieces = state.ply
+	turn = state.turn
+
+	useBits = cols * (rows+1) <= 64
+	if useBits:
+		H = rows + 1
+		bits = np.empty((2, games), dtype=np.uint64)
+		bits[0] = state.boards[0]
+		bits[1] = state.boards[1]
+		columnBits = np.arange(cols, dtype=np.uint64) * np.uint64(H)
+		shifts = [np.uint64(s) for s in (1, H, H+1, H-1)] # vertical, horizontal, diagonals
+		one = np.uint64(1)
+		_, bottom, boardMask, _ = shapeMasks((rows, cols))
+		bottom, boardMask = np.uint64(bottom), np.uint64(boardMask)
+	else:
+		windows, cellWindows = rolloutTables((rows, cols), n)
+		# One flattened board per game, with an extra always-empty cell for the dummy window
+		boards = np.zeros((games, rows*cols + 1), dtype=np.int8)
+		boards[:, :-1] = state.board.ravel()
+
+	firstMove = np.full(games, -1, dtype=np.intp)
+	winner = np.zeros(games, dtype=np.int8)
+	active = np.arange(games)
+
+	while len(active) and pieces < rows*cols:
+		# Pick a uniformly random legal column for each game still being played
+		legal = tops[active] < rows
+		choice = np.argmax(np.where(legal, rng.random(legal.shape), -1.0), axis=1)
+		if firstMove[0] < 0:
+			firstMove[:] = choice # every game is still active on the first ply
+		elif tactical and useBits:
+			# Win if possible, otherwise block the opponent's win
+			mine, theirs = bits[turn-1, active], bits[2-turn, active]
+			mask = mine | theirs
+			possible = (mask + bottom) & boardMask
+			forced = winningCells(mine, mask, H, boardMask, n) & possible
+			forced = np.where(forced != 0, forced, winningCells(theirs, mask, H, boardMask, n) & possible)
+			lowest = np.maximum(forced & (~forced + one), one) # lowest forced cell (1 if there is none)
+			choice = np.where(forced != 0, np.log2(lowest.astype(np.float64)).astype(np.intp) // H, choice)
+		height = tops[active, choice]
+		tops[active, choice] += 1
+		pieces += 1
+
+		# Drop the pieces and check each game for a win
+		if useBits:
+			b = bits[turn-1, active] | (one << (columnBits[choice] + height.astype(np.uint64)))
+			bits[turn-1, active] = b
+			won = np.zeros(len(active), dtype=bool)
+			for shift in shifts:
+				m = b
+				for k in range(1, n):
+					m = m & (b >> (shift * np.uint64(k)))
+				won |= m != 0
+		else:
+			cell = (rows - 1 - height) * cols + choice
+			boards[active, cell] = turn
+			cells = windows[cellWindows[cell]] # (games, K, n)
+			won = (boards[active[:, None, None], cells] == turn).all(axis=2).any(axis=1)
+
+		winner[active[won]] = turn
+		active = active[~won]
+		turn = 3 - turn
+
+	wins = np.bincount(firstMove[winner == player], minlength=cols)
+	losses = np.bincount(firstMove[winner == 3 - player], minlength=cols)
+	plays = np.bincount(firstMove, minlength=cols)
+	return wins, losses, plays
+
+def randomGame(boards, heights, turn, shape, rng, tactical=False, n=4):
+	'''
+	Play a single random game to the end on plain Python bitboards, won with n in a row.
+	boards and heights are lists in the bitboard layout and are modified in place.
+	rng is a random.Random. Returns the winner (0 for a tie).
+	'''
+	rows, cols = shape
+	H = rows + 1
+	pieces = sum(heights)
+	legal = [c for c in range(cols) if heights[c] < rows]
+	if tactical:
+		# Every cell that would win for each player, empty or not. A player's cells only
+		# change when they move, and a move wins exactly when it lands on one of them.
+		_, bottom, boardMask, _ = shapeMasks(shape)
+		cells = [winningCells(boards[0], 0, H, boardMask, n), winningCells(boards[1], 0, H, boardMask, n)]
+	while pieces < rows*cols:
+		if tactical:
+			possible = ((boards[0] | boards[1]) + bottom) & boardMask
+			forced = (cells[turn-1] & possible) or (cells[2-turn] & possible) # win, else block
+			if forced:
+				column = ((forced & -forced).bit_length() - 1) // H
+			else:
+				column = legal[int(rng.random() * len(legal))]
+			bit = 1 << (column*H + heights[column])
+			boards[turn-1] |= bit
+			won = bit & cells[turn-1]
+			cells[turn-1] = winningCells(boards[turn-1], 0, H, boardMask, n)
+		else:
+			column = legal[int(rng.random() * len(legal))]
+			boards[turn-1] |= 1 << (column*H + heights[column])
+			won = connected(boards[turn-1], H, n)
+		heights[column] += 1
+		pieces += 1
+		if won:
+			return turn
+		if heights[column] == rows:
+			legal.remove(column)
+		turn = 3 - turn
+	return 0
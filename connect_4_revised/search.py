@@ -0,0 +1,371 @@
+import time
+import numpy as np
+from bitboard import bitboard
+from deadline import deadline, searchTimeout
+from evaluation import evaluate, positionWeights
+from transposition import EXACT, LOWER, UPPER
+
+'''
+Depth-limited game tree search over bitboards, shared by minimaxAI and alphaBetaAI.
+
+searchCore is a mixin for connect4Player subclasses, set up with initSearch. It holds
+everything a search needs: move generation and ordering (orderColumns), making and
+taking back moves (bitboard.apply_move / undo_move), scoring finished games, the
+evaluation of positions at the search horizon, an optional transposition table and
+the node/cutoff/table hit counters players report as telemetry. A player is a
+configuration of it:
+- minimaxAI searches every move (pruning=False) without a transposition table, which
+  makes it the baseline for measuring how much alpha-beta prunes
+- alphaBetaAI prunes, keeps a transposition table and can use the 'pvs' search
+
+Two searches are available. MAX/MIN score positions from the searching player's point
+of view, with wins and losses as +-inf. negamax (principal variation search) scores
+them from the point of view of the player to move, with wins as WIN_SCORE less the
+number of pieces on the board.
+'''
+
+# Score of a win for the 'pvs' search, less the number of pieces on the board when it is
+# won so quicker wins score higher. Well above anything the evaluation function returns,
+# and finite so null windows around it still make sense.
+WIN_SCORE = 1000000
+
+class searchCore():
+	def initSearch(self, evaluation=None, pruning=True, tt=None, search='alphabeta', aspiration=25):
+		'''
+		Set up searching. evaluation(env, position) scores a position for position
+		(default: the heuristic in evaluation.py). Without pruning every move is searched.
+		tt is a transpositionTable or None.
+		'''
+		if search not in ('alphabeta', 'pvs'):
+			raise ValueError(f"Unknown search '{search}'. Use 'alphabeta' or 'pvs'")
+		self.evaluation = evaluation
+		self.pruning = pruning
+		self.tt = tt
+
+		# 'alphabeta' is the MAX/MIN search with full windows, 'pvs' is principal variation
+		# search (negamax) with aspiration windows of +-aspiration around an earlier depth's score
+		self.search = search
+		self.aspiration = aspiration
+
+		self.stopTime = np.inf # searches raise searchTimeout once time.time() passes this
+		self.deadline = deadline() # or once the move's deadline is cancelled
+
+		# Move ordering learned from cutoffs: up to two killer columns per number of pieces
+		# on the board, and a history score per player and cell
+		self.killers = {}
+		self.historyScores = [{}, {}]
+
+		# Search counters for telemetry, reset every move
+		self.resetCounters()
+
+	def resetCounters(self):
+		self.nodes = 0
+		self.cutoffs = 0
+		self.ttHits = 0
+
+	def evaluationFunction(self, env: bitboard) -> int:
+		if self.evaluation is not None:
+			return self.evaluation(env, self.position)
+		if env.evaluator is not None:
+			return env.evaluator.score(self.position)
+		return evaluate(env.board, self.position, env.n)
+
+	def sortColumnsByValue(self, env: bitboard) -> list:
+		"""
+		Sorts columns based on the sum of the positional weights of empty spaces in each column.
+		Columns with higher sums are prioritized.
+		"""
+		column_scores = []
+		weights = positionWeights(env.shape, env.n)
+
+		for col in range(env.shape[1]):
+			if env.topPosition[col] >= 0:
+				row = env.topPosition[col]
+				score = weights[row][col]
+				column_scores.append((col, score))
+
+		# Sort columns by their scores in descending order
+		column_scores.sort(key=lambda x: x[1], reverse=True)
+
+		# Return only the column indices (sorted)
+		return [col for col, score in column_scores]
+
+
+	def probeTable(self, env: bitboard, depth, alpha, beta):
+		"""
+		Look up the position in the transposition table.
+		Returns (value, alpha, beta, ttMove) where value is not None if the stored
+		result is deep enough to answer this node without searching it.
+		A position and its mirror image share one entry, keyed by env.canonicalHash.
+		"""
+		if self.tt is None:
+			return None, alpha, beta, -1
+		key, mirrored = env.canonicalHash()
+		entry = self.tt.probe(key)
+		if entry is None:
+			return None, alpha, beta, -1
+		ttDepth, flag, ttValue, ttMove = entry
+		if mirrored and ttMove >= 0:
+			ttMove = env.shape[1]-1 - ttMove
+		if ttDepth >= depth:
+			if flag == EXACT:
+				return ttValue, alpha, beta, ttMove
+			if flag == LOWER:
+				alpha = max(alpha, ttValue)
+			else:
+				beta = min(beta, ttValue)
+			if alpha >= beta:
+				return ttValue, alpha, beta, ttMove
+		return None, alpha, beta, ttMove
+
+	def storeTable(self, env: bitboard, depth, alpha, beta, value, move):
+		"""
+		Record the result of searching the position with window (alpha, beta)
+		"""
+		if self.tt is None:
+			return
+		if value <= alpha:
+			flag = UPPER
+		elif value >= beta:
+			flag = LOWER
+		else:
+			flag = EXACT
+		key, mirrored = env.canonicalHash()
+		if mirrored and move >= 0:
+			move = env.shape[1]-1 - move
+		self.tt.store(key, depth, flag, value, move)
+
+	def orderColumns(self, env: bitboard, ttMove, player) -> list:
+		"""
+		Columns in the order to search them for player: the best move from the transposition
+		table, then the killer moves for this ply, then by history score, with the positional
+		value table breaking ties
+		"""
+		killers = self.killers.get(env.moves, ())
+		history = self.historyScores[player-1]
+		H = env.H
+		cols = env.shape[1]
+		weights = positionWeights(env.shape, env.n)
+		symmetric = env.hash == env.mirrorHash # only search one of each pair of mirrored moves
+		columns = []
+		for col in range(cols):
+			row = env.topPosition[col]
+			if row >= 0 and not (symmetric and col > cols-1 - col):
+				if col == ttMove:
+					rank = 0
+				elif col in killers:
+					rank = 1 + killers.index(col)
+				else:
+					rank = 3
+				columns.append((rank, -history.get(col*H + env.heights[col], 0), -weights[row][col], col))
+		columns.sort()
+		return [col for _, _, _, col in columns]
+
+	def recordCutoff(self, env: bitboard, column, player, depth):
+		"""
+		Remember a move that caused a cutoff as a killer for this ply and raise its history score
+		"""
+		killers = self.killers.get(env.moves, [])
+		if column not in killers:
+			self.killers[env.moves] = [column] + killers[:1]
+		bit = column*env.H + env.heights[column]
+		history = self.historyScores[player-1]
+		history[bit] = history.get(bit, 0) + depth*depth
+
+	def ageHistory(self):
+		"""
+		Halve the history scores so the ordering follows the current part of the game
+		"""
+		for history in self.historyScores:
+			for bit in history:
+				history[bit] //= 2
+
+	def MAX(self, env: bitboard, depth, alpha, beta, move_dict: dict):
+		if time.time() > self.stopTime or self.deadline.cancelled:
+			raise searchTimeout()
+		self.nodes += 1
+		ttValue, alpha, beta, ttMove = self.probeTable(env, depth, alpha, beta)
+		if ttValue is not None:
+			self.ttHits += 1
+			return ttValue
+		if depth == 0:
+			value = self.evaluationFunction(env)
+			self.storeTable(env, 0, -np.inf, np.inf, value, -1)
+			return value
+
+		sortedColumns = self.orderColumns(env, ttMove, self.position)
+
+		window = (alpha, beta)
+		value = -np.inf
+		bestMove = sortedColumns[0]
+		for column in sortedColumns:
+			if env.apply_move(column, self.position):
+				# Our move ended the game, either with a win or a full board
+				result = np.inf if env.is_winner else 0
+			else:
+				result = self.MIN(env, depth-1, alpha, beta, move_dict)
+			env.undo_move()
+
+			if result > value:
+				value = result
+				bestMove = column
+			if value >= beta and self.pruning:
+				self.cutoffs += 1
+				self.recordCutoff(env, column, self.position, depth)
+				break
+			if self.pruning:
+				alpha = max(alpha, value)
+
+		self.storeTable(env, depth, *window, value, bestMove)
+		return value
+
+	def MIN(self, env: bitboard, depth, alpha, beta, move_dict: dict):
+		if time.time() > self.stopTime or self.deadline.cancelled:
+			raise searchTimeout()
+		self.nodes += 1
+		ttValue, alpha, beta, ttMove = self.probeTable(env, depth, alpha, beta)
+		if ttValue is not None:
+			self.ttHits += 1
+			return ttValue
+		if depth == 0:
+			value = self.evaluationFunction(env)
+			self.storeTable(env, 0, -np.inf, np.inf, value, -1)
+			return value
+
+		sortedColumns = self.orderColumns(env, ttMove, 3 - self.position)
+
+		window = (alpha, beta)
+		value = np.inf
+		bestMove = sortedColumns[0]
+		for column in sortedColumns:
+			if env.apply_move(column, 3 - self.position):
+				# Opponent's move ended the game, either with a win or a full board
+				result = -np.inf if env.is_winner else 0
+			else:
+				result = self.MAX(env, depth-1, alpha, beta, move_dict)
+			env.undo_move()
+
+			if result < value:
+				value = result
+				bestMove = column
+			if value <= alpha and self.pruning:
+				self.cutoffs += 1
+				self.recordCutoff(env, column, 3 - self.position, depth)
+				break
+			if self.pruning:
+				beta = min(beta, value)
+
+		self.storeTable(env, depth, *window, value, bestMove)
+		return value
+
+	def negamax(self, env: bitboard, depth, alpha, beta, player):
+		"""
+		Principal variation search: value of the position for player, the player to move.
+		The first move is searched with the full window and the rest with a null window
+		that only proves they are no better, re-searching the ones that turn out better.
+		Wins score WIN_SCORE less the number of pieces on the board.
+		"""
+		if time.time() > self.stopTime or self.deadline.cancelled:
+			raise searchTimeout()
+		self.nodes += 1
+		ttValue, alpha, beta, ttMove = self.probeTable(env, depth, alpha, beta)
+		if ttValue is not None:
+			self.ttHits += 1
+			return ttValue
+		if depth == 0:
+			value = self.evaluationFunction(env)
+			if player != self.position:
+				value = -value
+			self.storeTable(env, 0, -np.inf, np.inf, value, -1)
+			return value
+
+		sortedColumns = self.orderColumns(env, ttMove, player)
+
+		window = (alpha, beta)
+		value = -np.inf
+		bestMove = sortedColumns[0]
+		for i, column in enumerate(sortedColumns):
+			if env.apply_move(column, player):
+				# Our move ended the game, either with a win or a full board
+				result = WIN_SCORE - env.moves if env.is_winner else 0
+			elif i == 0:
+				result = -self.negamax(env, depth-1, -beta, -alpha, 3 - player)
+			else:
+				result = -self.negamax(env, depth-1, -alpha-1, -alpha, 3 - player)
+				if alpha < result < beta:
+					result = -self.negamax(env, depth-1, -beta, -alpha, 3 - player)
+			env.undo_move()
+
+			if result > value:
+				value = result
+				bestMove = column
+			if value >= beta:
+				self.cutoffs += 1
+				self.recordCutoff(env, column, player, depth)
+				break
+			alpha = max(alpha, value)
+
+		self.storeTable(env, depth, *window, value, bestMove)
+		return value
+
+	def searchRoot(self, env: bitboard, depth, columns, move_dict: dict):
+		'''
+		Search every root move to the given depth and return (bestValue, bestMove)
+		'''
+		bestValue = -np.inf
+		bestMove = columns[0]
+		for column in columns:
+			if env.apply_move(column, self.position):
+				value = np.inf if env.is_winner else 0
+			else:
+				value = self.MIN(env, depth, bestValue if self.pruning else -np.inf, np.inf, move_dict)
+			env.undo_move()
+			if value > bestValue:
+				bestValue = value
+				bestMove = column
+		return bestValue, bestMove
+
+	def searchRootWindow(self, env: bitboard, depth, columns, alpha, beta):
+		'''
+		searchRoot for the 'pvs' search, with window (alpha, beta).
+		Returns (bestValue, bestMove), where bestValue is only a bound if it is outside the window.
+		'''
+		bestValue = -np.inf
+		bestMove = columns[0]
+		for i, column in enumerate(columns):
+			if env.apply_move(column, self.position):
+				value = WIN_SCORE - env.moves if env.is_winner else 0
+			elif i == 0:
+				value = -self.negamax(env, depth, -beta, -alpha, 3 - self.position)
+			else:
+				value = -self.negamax(env, depth, -alpha-1, -alpha, 3 - self.position)
+				if alpha < value < beta:
+					value = -self.negamax(env, depth, -beta, -alpha, 3 - self.position)
+			env.undo_move()
+			if value > bestValue:
+				bestValue = value
+				bestMove = column
+			if value >= beta:
+				break
+			alpha = max(alpha, value)
+		return bestValue, bestMove
+
+	def searchRootAspiration(self, env: bitboard, depth, columns, guess):
+		'''
+		searchRootWindow with a narrow window around guess, widened and searched again
+		whenever the score falls outside it. The evaluation swings back and forth between
+		odd and even depths, so the guess is the score from two depths back.
+		'''
+		if guess is None:
+			return self.searchRootWindow(env, depth, columns, -np.inf, np.inf)
+		delta = self.aspiration
+		alpha, beta = guess - delta, guess + delta
+		while True:
+			bestValue, bestMove = self.searchRootWindow(env, depth, columns, alpha, beta)
+			if alpha < bestValue < beta:
+				return bestValue, bestMove
+			delta *= 4
+			if bestValue <= alpha:
+				alpha = guess - delta if delta < WIN_SCORE else -np.inf
+			else:
+				beta = guess + delta if delta < WIN_SCORE else np.inf
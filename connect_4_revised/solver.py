@@ -0,0 +1,176 @@
+import time
+from deadline import deadline, searchTimeout
+from bitboard import mirror
+from threats import winningCells
+
+'''
+Exact solver for connect4 positions.
+
+Negamax with alpha-beta on bitboards, in the bitboard layout (rows+1 bits per column).
+A position is the bitboard of the player to move plus a mask of all pieces. Scores are
+from the point of view of the player to move: 0 for a tie, and for a win the number of
+that player's pieces still unplayed when they win, plus one (negative for a loss), so
+quicker wins score higher.
+
+The value of the root is found with a sequence of null-window searches that narrow the
+range it can be in, and every search shares one table of bounds keyed by position. A
+position and its mirror image have the same value, so they share one key when the root
+could lead to both, i.e. when no piece of the root's mirror image clashes with a piece of
+the root. Keys from searches that didn't mirror them still name the same position.
+Search is only fast enough in Python once most of the board is full, which is when
+the players switch to it.
+'''
+
+class endgameSolver():
+	def __init__(self, board_shape=(6,7), table_size=1<<20, n=4):
+		self.shape = board_shape
+		self.n = n # pieces in a row needed to win
+		rows, cols = board_shape
+		self.H = rows + 1
+		self.size = rows * cols
+		self.bottom = sum(1 << (c*self.H) for c in range(cols))
+		self.boardMask = self.bottom * ((1 << rows) - 1) # every playable cell
+		self.columnMasks = [((1 << rows) - 1) << (c*self.H) for c in range(cols)]
+		self.order = sorted(range(cols), key=lambda c: abs(2*c - (cols-1))) # center columns first
+
+		self.table = {} # position key -> (lower bound, upper bound)
+		self.mirrorKeys = False # key positions and their mirror images alike
+		self.table_size = table_size # entries kept before the table is cleared
+		self.nodes = 0
+		self.stopTime = float('inf')
+		self.deadline = deadline()
+
+	def winningCells(self, position, mask):
+		'''
+		Empty cells that would give the player owning position n in a row
+		'''
+		return winningCells(position, mask, self.H, self.boardMask, self.n)
+
+	def nonLosingMoves(self, position, mask):
+		'''
+		Moves (as bits) for the player to move that don't let the opponent win next turn.
+		If the opponent threatens to win, only blocking moves are left.
+		'''
+		possible = (mask + self.bottom) & self.boardMask
+		threats = self.winningCells(position ^ mask, mask)
+		forced = possible & threats
+		if forced:
+			if forced & (forced - 1):
+				return 0 # two threats can't both be blocked
+			possible = forced
+		return possible & ~(threats >> 1) # don't play right under an opponent's winning cell
+
+	def negamax(self, position, mask, moves, alpha, beta):
+		'''
+		Score of the position if it is in (alpha, beta), otherwise a bound on the side of
+		the window it is on. The player to move must not be able to win immediately.
+		'''
+		self.nodes += 1
+		if self.nodes & 1023 == 0 and (time.time() > self.stopTime or self.deadline.cancelled):
+			raise searchTimeout()
+
+		candidates = self.nonLosingMoves(position, mask)
+		if not candidates:
+			return -((self.size - moves) // 2)
+		if moves >= self.size - 2:
+			return 0
+
+		low = -((self.size - 2 - moves) // 2) # we can't win now and the opponent can't win next move
+		high = (self.size - 1 - moves) // 2 # we can't win now
+		key = position + mask
+		if self.mirrorKeys:
+			key = min(key, mirror(key, self.shape)) # no column's key can carry into the next
+		bounds = self.table.get(key)
+		if bounds is not None:
+			low, high = max(low, bounds[0]), min(high, bounds[1])
+		if low >= beta:
+			return low
+		if high <= alpha:
+			return high
+		alpha, beta = max(alpha, low), min(beta, high)
+
+		# Try the moves that create the most winning cells first, center columns first on ties
+		moveList = []
+		for c in self.order:
+			move = candidates & self.columnMasks[c]
+			if move:
+				moveList.append((-bin(self.winningCells(position | move, mask)).count('1'), len(moveList), move))
+		moveList.sort()
+
+		window = alpha
+		for _, _, move in moveList:
+			score = -self.negamax(position ^ mask, mask | move, moves + 1, -beta, -alpha)
+			if score >= beta:
+				self.store(key, score, high)
+				return score
+			if score > alpha:
+				alpha = score
+		if alpha > window:
+			self.store(key, alpha, alpha)
+		else:
+			self.store(key, low, alpha)
+		return alpha
+
+	def store(self, key, low, high):
+		if len(self.table) >= self.table_size:
+			self.table.clear()
+		self.table[key] = (low, high)
+
+	def value(self, position, mask, moves):
+		'''
+		Exact score of a position where the player to move can't win immediately,
+		found with null-window searches
+		'''
+		low = -((self.size - moves) // 2)
+		high = (self.size + 1 - moves) // 2
+		while low < high:
+			med = low + (high - low) // 2
+			if med <= 0 and int(low / 2) < med:
+				med = int(low / 2)
+			elif med >= 0 and int(high / 2) > med:
+				med = int(high / 2)
+			score = self.negamax(position, mask, moves, med, med + 1)
+			if score <= med:
+				high = score
+			else:
+				low = score
+		return low
+
+	def solve(self, state, stopTime=float('inf'), moveDeadline=None):
+		'''
+		(score, move) with perfect play from a GameState.
+		Raises searchTimeout if time.time() passes stopTime or moveDeadline is cancelled.
+		'''
+		self.stopTime = stopTime
+		self.deadline = deadline() if moveDeadline is None else moveDeadline
+		self.nodes = 0
+		position = state.boards[state.turn-1]
+		mask = state.boards[0] | state.boards[1]
+		moves = state.ply
+		self.mirrorKeys = not (mirror(position, self.shape) & (mask ^ position) or mirror(mask ^ position, self.shape) & position)
+		possible = (mask + self.bottom) & self.boardMask
+		columns = [c for c in self.order if possible & self.columnMasks[c]]
+
+		# Win right away if we can
+		wins = self.winningCells(position, mask) & possible
+		for c in columns:
+			if wins & self.columnMasks[c]:
+				return (self.size + 1 - moves) // 2, c
+
+		candidates = self.nonLosingMoves(position, mask)
+		if not candidates:
+			# Every move loses next turn, so at least block one threat
+			threats = self.winningCells(position ^ mask, mask) & possible
+			for c in columns:
+				if threats & self.columnMasks[c]:
+					return -((self.size - moves) // 2), c
+			return -((self.size - moves) // 2), columns[0]
+
+		score = self.value(position, mask, moves)
+
+		# Find a move that keeps the score: one whose reply scores at most -score
+		for c in columns:
+			move = candidates & self.columnMasks[c]
+			if move and self.negamax(position ^ mask, mask | move, moves + 1, -score, -score + 1) <= -score:
+				return score, c
+		return score, [c for c in columns if candidates & self.columnMasks[c]][0]
@@ -0,0 +1,78 @@
+import json
+import time
+
+'''
+Per-move search statistics.
+
+connect4 hands every player a moveDict, which notes when move_dict["move"] is first and
+last set. Players report what their search did by setting move_dict["stats"] to a dict
+of counters, updated whenever they publish a move so the numbers are there even if they
+get stopped at their time limit. The counters players report:
+- nodes: positions searched (alphaBetaAI, minimaxAI, the endgame solver)
+- depth: deepest completed search
+- cutoffs: alpha-beta cutoffs
+- tt_hits: transposition table probes that answered a position without searching it
+- rollouts: random games played (monteCarloAI)
+- book / solved / forced: the move came from the opening book / the endgame solver /
+  the check for a move that wins or blocks a win (threats.forcedMove)
+
+connect4 adds the timing of each move to the player's counters and keeps one entry per
+move in connect4.telemetry, writing it as a JSON line if given a path. aggregate sums
+the entries up per player.
+'''
+
+COUNTERS = ('nodes', 'cutoffs', 'tt_hits', 'rollouts')
+
+class moveDict(dict):
+	'''
+	move_dict that remembers when the move was first and last set
+	'''
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.firstUpdate = None
+		self.lastUpdate = None
+
+	def __setitem__(self, key, value):
+		if key == "move":
+			now = time.time()
+			if self.firstUpdate is None:
+				self.firstUpdate = now
+			self.lastUpdate = now
+		super().__setitem__(key, value)
+
+def moveEntry(move_dict, start, end, **fields):
+	'''
+	Telemetry entry for one move: fields, the player's stats and when the move was set,
+	in seconds after start (None if the player never set it)
+	'''
+	entry = dict(fields)
+	entry['seconds'] = round(end - start, 6)
+	entry['first_update'] = None if move_dict.firstUpdate is None else round(move_dict.firstUpdate - start, 6)
+	entry['last_update'] = None if move_dict.lastUpdate is None else round(move_dict.lastUpdate - start, 6)
+	entry.update(move_dict.get("stats", {}))
+	return entry
+
+def aggregate(entries):
+	'''
+	Totals per agent: moves, seconds, the summed counters and nodes per second
+	'''
+	totals = {}
+	for entry in entries:
+		row = totals.setdefault(entry['agent'], dict({'moves': 0, 'seconds': 0.0, 'max_depth': 0}, **{c: 0 for c in COUNTERS}))
+		row['moves'] += 1
+		row['seconds'] += entry['seconds']
+		row['max_depth'] = max(row['max_depth'], entry.get('depth', 0))
+		for c in COUNTERS:
+			row[c] += entry.get(c, 0)
+	for row in totals.values():
+		row['nodes_per_second'] = round(row['nodes'] / row['seconds']) if row['seconds'] > 0 else 0
+		row['rollouts_per_second'] = round(row['rollouts'] / row['seconds']) if row['seconds'] > 0 else 0
+	return totals
+
+def writeEntry(path, entry):
+	'''
+	Append an entry to a JSON lines file. Each line goes out in a single write, so
+	several processes can share one file.
+	'''
+	with open(path, 'a') as f:
+		f.write(json.dumps(entry) + '\n')
@@ -1,64 +1,48 @@
-from connect4 import connect4
-from players import randomAI, alphaBetaAI
-from montecarlo import monteCarloAI
+import sys
+from tournament import runTournament, summarize
+from checks import runChecks
 
 
 board_shape = (6,7)
-visualize = False 
-verbose = False
-limit_players = (1,2)
 time_limit = (3.0, 3.0)
-cvd_mode = False
+n_trials = 5 # games per competitor with each side moving first
+workers = 0 # games played at once (0 uses every core)
 
-def play_game(p1, p2):
+def progress(result):
     '''
-    p1 - connect4Player - player who will play first 
-    p2 - connect4Player - player who will play second 
-
-    returns winner
+    Print each game as it finishes from alphaBetaAI's point of view
     '''
+    position = 1 if result['p1'] == 'alphaBetaAI' else 2
+    competitor = result['p2'] if position == 1 else result['p1']
+    w, t = result['winner'] == position, result['winner'] == 0
+    print(f"Competitor: {competitor} Game: {result['game']} Seed: {result['seed']} W: {int(w)} T: {int(t)} L: {int(not w and not t)}", flush=True)
 
-    c4 = connect4(
-        player1 = p1, 
-        player2 = p2, 
-        board_shape = board_shape,
-        visualize = visualize,
-        limit_players = limit_players,
+def checkProgress(name, problems):
+    '''
+    Print each check's result as it finishes
+    '''
+    print(f"{name}: {'ok' if not problems else f'{len(problems)} problems'}", flush=True)
+    for problem in problems:
+        print(f"  {problem}")
+
+if __name__ == '__main__':
+    # The fast paths have to agree with brute force before the games mean anything
+    if runChecks(progress=checkProgress):
+        sys.exit(1)
+
+    results = runTournament(
+        ['alphaBetaAI', 'randomAI', 'monteCarloAI'],
+        games = n_trials,
+        fmt = 'gauntlet',
+        workers = workers,
         time_limit = time_limit,
-        verbose = verbose,
-        save = False,
-        CVDMode = False,
-        print_time_logs= True
-        ) 
-
-    winner = c4.play()
-
-    return winner == 0, winner == 1, winner == 2
-
-w = 0 
-t = 0 
-l = 0
-
-for competitor, n_trials in zip([randomAI, monteCarloAI], [5, 5]): 
-    for i in range(n_trials):
-        
-        # You play first
-        t1, w1, l1 = play_game(alphaBetaAI(1, i), competitor(2, i))
-        # You play second
-        t2, l2, w2 = play_game(competitor(1, i), alphaBetaAI(2, i))
-
-        # Track metrics
-        w += w1 + w2
-        t += t1 + t2
-        l += l1 + l2
-
-        print(f"Competitor: {competitor} Test: {i} W: {w1 + w2} T: {t1 + t2} L: {l1 + l2}" )
-
-# Print Metrics
-# wins are worth 1pt and ties are worth 0.5pts
-points = w + t * 0.5
-
-print(f"Wins: {w} | Ties: {t} | Losses: {l} | Points: {points}/20")
-
+        board_shape = board_shape,
+        progress = progress
+        )
 
+    # Print Metrics
+    # wins are worth 1pt and ties are worth 0.5pts
+    row = summarize(results)['alphaBetaAI']
 
+    print(f"Wins: {row['wins']} | Ties: {row['ties']} | Losses: {row['losses']} | Points: {row['points']}/{row['games']}")
+    print(f"Elo vs field: {row['elo']:+.0f} [{row['elo_low']:+.0f}, {row['elo_high']:+.0f}]")
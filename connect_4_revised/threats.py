@@ -0,0 +1,115 @@
+from functools import lru_cache
+
+'''
+Immediate threats: winning moves, moves that block the opponent's win and moves that
+hand the opponent a win, worked out with a handful of shifts on the bitboards (in the
+bitboard layout, rows+1 bits per column) so they are cheap enough to check before
+every search and on every move of a random game. n is the number of pieces in a row
+needed to win.
+
+winningCells works on Python ints and on NumPy uint64 arrays alike, so batched
+rollouts use it too. Python's ints are unbounded while uint64 drops the bits shifted
+past the top, which never matters since the result is masked to the board.
+'''
+
+@lru_cache(maxsize=None)
+def shapeMasks(board_shape):
+	'''
+	(H, bottom, boardMask, columnMasks) for a board shape: bits per column, the bottom cell
+	of every column, every playable cell, and the playable cells of each column
+	'''
+	rows, cols = board_shape
+	H = rows + 1
+	bottom = sum(1 << (c*H) for c in range(cols))
+	boardMask = bottom * ((1 << rows) - 1)
+	columnMasks = tuple(((1 << rows) - 1) << (c*H) for c in range(cols))
+	return H, bottom, boardMask, columnMasks
+
+def winningCells(position, mask, H, boardMask, n=4):
+	'''
+	Empty cells (playable now or not) that would give the player owning position n in a row.
+	mask holds every piece on the board.
+	'''
+	p = position
+	if n == 4:
+		# The usual case, with the runs on either side of a cell shared between patterns
+		r = (p << 1) & (p << 2) & (p << 3) # vertical
+		for shift in (H, H-1, H+1): # horizontal and the two diagonals
+			pair = (p << shift) & (p << 2*shift)
+			r |= pair & (p << 3*shift)
+			r |= pair & (p >> shift)
+			pair = (p >> shift) & (p >> 2*shift)
+			r |= pair & (p << shift)
+			r |= pair & (p >> 3*shift)
+		return r & (boardMask ^ mask)
+
+	# before[k] / after[k]: cells with k pieces in a row right before / after them
+	r = p << 1
+	for k in range(2, n):
+		r &= p << k # vertical: n-1 pieces right below
+	for shift in (H, H-1, H+1):
+		before = [None, p << shift]
+		after = [None, p >> shift]
+		for k in range(2, n):
+			before.append(before[-1] & (p << k*shift))
+			after.append(after[-1] & (p >> k*shift))
+		r |= before[n-1] | after[n-1]
+		for k in range(1, n-1):
+			r |= before[k] & after[n-1-k]
+	return r & (boardMask ^ mask)
+
+def threatMasks(boards, turn, board_shape, n=4):
+	'''
+	(possible, wins, blocks, unsafe) as bitmasks of cells, for the player to move:
+	- possible: the cell each column would be played in
+	- wins: possible cells that win the game right away
+	- blocks: possible cells the opponent would win with next move
+	- unsafe: possible cells right under a cell the opponent would win with, so playing
+	  them lets the opponent win
+	'''
+	H, bottom, boardMask, _ = shapeMasks(board_shape)
+	mask = boards[0] | boards[1]
+	possible = (mask + bottom) & boardMask
+	theirs = winningCells(boards[2-turn], mask, H, boardMask, n)
+	wins = winningCells(boards[turn-1], mask, H, boardMask, n) & possible
+	return possible, wins, theirs & possible, (theirs >> 1) & possible
+
+def forcedColumn(boards, turn, board_shape, n=4):
+	'''
+	Column the player to move has to play, or -1 if there is none: a winning move if
+	there is one, otherwise a move that blocks the opponent's win. With two threats to
+	block the game is lost either way, and the first one is blocked.
+	'''
+	possible, wins, blocks, _ = threatMasks(boards, turn, board_shape, n)
+	forced = wins or blocks
+	if not forced:
+		return -1
+	return ((forced & -forced).bit_length() - 1) // (board_shape[0] + 1)
+
+def safeColumns(boards, turn, board_shape, n=4):
+	'''
+	Legal columns that don't hand the opponent a win next move: if the opponent threatens
+	to win, only the block, otherwise none of the moves right under the opponent's winning
+	cells. All of the legal columns if every one of them loses.
+	'''
+	possible, _, blocks, unsafe = threatMasks(boards, turn, board_shape, n)
+	_, _, _, columnMasks = shapeMasks(board_shape)
+	if blocks & (blocks - 1):
+		safe = 0 # two threats can't both be blocked
+	else:
+		safe = (blocks or possible) & ~unsafe
+	if not safe:
+		safe = possible
+	return [c for c, columnMask in enumerate(columnMasks) if safe & columnMask]
+
+def forcedMove(state):
+	'''
+	Column a GameState's player to move has to play (see forcedColumn), or -1
+	'''
+	return forcedColumn(state.boards, state.turn, state.shape, state.n)
+
+def safeMoves(state):
+	'''
+	Legal columns of a GameState that don't hand the opponent a win (see safeColumns)
+	'''
+	return safeColumns(state.boards, state.turn, state.shape, state.n)
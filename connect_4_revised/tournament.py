@@ -0,0 +1,189 @@
+import argparse
+import math
+import time
+from connect4 import connect4
+from main import agents, agentOptions, parser as agentParser
+from parallel import workerPool
+from records import openWriter
+
+'''
+Run many games between agents from main.py's agents registry across a pool of worker processes.
+
+Every game gets a fixed seed derived from the tournament seed and the game's index in the
+schedule, so rerunning a tournament with the same arguments replays the same games (up to
+how far time-limited searches get). Results are printed as games finish, followed by a
+table of W/T/L, points and Elo estimates with 95% confidence intervals.
+
+Agent options from main.py (e.g. -tt_size, -mc_mode) are accepted and passed on to the agents.
+'''
+
+def schedule(names, games, fmt='roundrobin', seed=0):
+	'''
+	List of (game, player1, player2, seed) to play.
+	Each pairing plays `games` games with each agent moving first.
+	- 'roundrobin': every agent plays every other agent
+	- 'gauntlet': the first agent plays each of the others
+	'''
+	if fmt == 'roundrobin':
+		pairings = [(a, b) for i, a in enumerate(names) for b in names[i+1:]]
+	elif fmt == 'gauntlet':
+		pairings = [(names[0], b) for b in names[1:]]
+	else:
+		raise ValueError(f"Unknown tournament format '{fmt}'. Use 'roundrobin' or 'gauntlet'")
+
+	jobs = []
+	for a, b in pairings:
+		for i in range(games):
+			jobs.append((a, b))
+			jobs.append((b, a))
+	return [(game, p1, p2, seed * 1000003 + game) for game, (p1, p2) in enumerate(jobs)]
+
+def playScheduledGame(job):
+	'''
+	Worker process job: play one scheduled game and return its result
+	'''
+	(game, p1, p2, seed), settings = job
+	options = settings['options']
+	start = time.time()
+	c4 = connect4(
+		agents[p1](1, seed, **options.get(p1, {})),
+		agents[p2](2, seed, **options.get(p2, {})),
+		board_shape=settings['board_shape'],
+		visualize=False,
+		limit_players=[1,2],
+		time_limit=list(settings['time_limit']),
+		verbose=False,
+		backend=settings['backend'],
+		enforcement=settings['enforcement'],
+		game=game,
+		save=bool(settings['record']),
+		record_path=settings['record'],
+		n=settings['n'])
+	winner = c4.play()
+	if settings['record']:
+		openWriter(settings['record']).flush() # pool workers are killed, not shut down, when the tournament ends
+	return {'game': game, 'p1': p1, 'p2': p2, 'seed': seed, 'winner': winner,
+		'moves': len(c4.history[0]) + len(c4.history[1]), 'seconds': round(time.time() - start, 3)}
+
+def checkSettings(names, enforcement='trace', options=None):
+	'''
+	Raise ValueError if the games can't be played inside pool workers: pool workers are
+	daemonic, so neither the 'process' enforcement nor agents that start worker pools of
+	their own can run in them
+	'''
+	if enforcement == 'process':
+		raise ValueError("Tournament games already run in pool workers, so the 'process' enforcement is not available")
+	for name in names:
+		if agents[name](1, **(options or {}).get(name, {})).usesWorkerPool():
+			raise ValueError(f"{name} starts its own worker pool, which tournament games can't do (use -mc_mode batch and -ab_workers 1)")
+
+def runTournament(names, games=1, fmt='roundrobin', seed=0, workers=None, time_limit=(1.0, 1.0),
+		board_shape=(6,7), backend='numpy', enforcement='trace', record='', options=None, progress=print, n=4):
+	'''
+	Play the whole schedule on a worker pool and return the results in schedule order.
+	progress is called with each result as soon as its game finishes.
+	Raises ValueError for settings tournament games can't be played with (see checkSettings).
+	With a record path every game is appended to that game record file.
+	'''
+	checkSettings(names, enforcement, options)
+	settings = {'options': options or {}, 'time_limit': time_limit, 'board_shape': board_shape, 'n': n, 'backend': backend, 'enforcement': enforcement, 'record': record}
+	jobs = [(entry, settings) for entry in schedule(names, games, fmt, seed)]
+	results = []
+	for result in workerPool(workers).imap_unordered(playScheduledGame, jobs):
+		results.append(result)
+		if progress is not None:
+			progress(result)
+	return sorted(results, key=lambda result: result['game'])
+
+def elo(score, games):
+	'''
+	Elo difference implied by scoring `score` points in `games` games.
+	Scores of 0% and 100% are clamped to half a game so the estimate stays finite.
+	'''
+	p = min(max(score / games, 0.5 / games), 1 - 0.5 / games)
+	return -400 * math.log10(1 / p - 1)
+
+def eloInterval(wins, ties, losses):
+	'''
+	Elo estimate with a 95% confidence interval from a W/T/L record: (elo, low, high).
+	The interval is a Wilson score interval with ties counted as half a win, so it stays
+	honest for 0% and 100% scores, where the bound on the unbeaten side is infinite.
+	'''
+	games = wins + ties + losses
+	score = wins + 0.5 * ties
+	p = score / games
+	z = 1.96
+	center = (p + z*z / (2*games)) / (1 + z*z / games)
+	margin = z / (1 + z*z / games) * math.sqrt(p * (1 - p) / games + z*z / (4 * games*games))
+	low, high = center - margin, center + margin
+	return (elo(score, games),
+		-400 * math.log10(1 / low - 1) if p > 0 else -math.inf,
+		-400 * math.log10(1 / high - 1) if p < 1 else math.inf)
+
+def summarize(results):
+	'''
+	Per-agent totals: {name: {'wins', 'ties', 'losses', 'points', 'games', 'elo', 'elo_low', 'elo_high'}}
+	where Elo is relative to the average opponent faced
+	'''
+	table = {}
+	for result in results:
+		for position, name in ((1, result['p1']), (2, result['p2'])):
+			row = table.setdefault(name, {'wins': 0, 'ties': 0, 'losses': 0})
+			if result['winner'] == 0:
+				row['ties'] += 1
+			elif result['winner'] == position:
+				row['wins'] += 1
+			else:
+				row['losses'] += 1
+	for row in table.values():
+		row['games'] = row['wins'] + row['ties'] + row['losses']
+		row['points'] = row['wins'] + 0.5 * row['ties']
+		row['elo'], row['elo_low'], row['elo_high'] = eloInterval(row['wins'], row['ties'], row['losses'])
+	return table
+
+def report(results):
+	table = summarize(results)
+	print(f"{'Agent':<16}{'W':>6}{'T':>6}{'L':>6}{'Points':>10}   Elo (95% CI)")
+	for name, row in sorted(table.items(), key=lambda item: -item[1]['points']):
+		print(f"{name:<16}{row['wins']:>6}{row['ties']:>6}{row['losses']:>6}{row['points']:>7}/{row['games']:<4}"
+			f"{row['elo']:+7.0f} [{row['elo_low']:+.0f}, {row['elo_high']:+.0f}]")
+
+if __name__ == '__main__':
+	tournamentParser = argparse.ArgumentParser(description='Run a connect4 tournament across worker processes')
+	tournamentParser.add_argument('-agents', default='alphaBetaAI,monteCarloAI,randomAI', type=str, help='Comma separated agents from main.py')
+	tournamentParser.add_argument('-format', default='roundrobin', type=str, help='Use any of the following: [roundrobin, gauntlet]. Gauntlet plays the first agent against the rest')
+	tournamentParser.add_argument('-games', default=5, type=int, help='Games per pairing with each agent moving first')
+	tournamentParser.add_argument('-pool', default=0, type=int, help='Games played at once (0 uses every core)')
+	tournamentParser.add_argument('-quiet', default='False', type=str, help='Only print the final table')
+
+	# Everything else (board size, seed, time limits, agent options) uses main.py's arguments
+	args, rest = tournamentParser.parse_known_args()
+	gameArgs = agentParser.parse_args(rest)
+	bool_dict = {'True': True, 'False': False}
+
+	def progress(result):
+		print(f"Game {result['game']}: {result['p1']} vs {result['p2']} seed {result['seed']} "
+			f"winner {result['winner']} in {result['moves']} moves ({result['seconds']}s)", flush=True)
+
+	names = args.agents.split(',')
+	options = agentOptions(gameArgs)
+	try:
+		checkSettings(names, gameArgs.enforcement, options)
+	except ValueError as e:
+		tournamentParser.error(str(e))
+
+	results = runTournament(
+		names,
+		games=args.games,
+		fmt=args.format,
+		seed=gameArgs.seed,
+		workers=args.pool,
+		time_limit=tuple(float(v) for v in gameArgs.time_limit.split(',')),
+		board_shape=(gameArgs.w, gameArgs.l),
+		backend=gameArgs.backend,
+		enforcement=gameArgs.enforcement,
+		record=gameArgs.record,
+		options=options,
+		progress=None if bool_dict[args.quiet] else progress,
+		n=gameArgs.n)
+	report(results)
@@ -0,0 +1,66 @@
+import numpy as np
+
+# Bound types stored with each entry
+EXACT = 0 # value is the exact minimax value of the position
+LOWER = 1 # search failed high, the real value is >= value
+UPPER = 2 # search failed low, the real value is <= value
+
+# Bytes used by one entry: key (8) + value (8) + depth, flag, move (1 each)
+ENTRY_BYTES = 19
+
+class transpositionTable():
+	'''
+	Fixed-size hash table of search results keyed by a 64-bit Zobrist hash.
+
+	Memory is allocated up front as NumPy arrays, sized to the largest power of two
+	number of entries that fits in size_mb megabytes. Each slot holds one entry, and
+	when two positions map to the same slot the replacement policy decides which one
+	is kept:
+	- 'always' overwrites the slot with the newest result
+	- 'depth' only overwrites a different position if the new result was searched at
+	  least as deep as the stored one
+	'''
+	def __init__(self, size_mb=16, replace='depth'):
+		if replace not in ('always', 'depth'):
+			raise ValueError(f"Unknown replacement policy '{replace}'. Use 'always' or 'depth'")
+		self.replace = replace
+
+		entries = 1
+		while entries * 2 * ENTRY_BYTES <= size_mb * 2**20:
+			entries *= 2
+		self.mask = entries - 1
+
+		self.keys = np.zeros(entries, dtype=np.uint64)
+		self.values = np.zeros(entries, dtype=np.float64)
+		self.depths = np.full(entries, -1, dtype=np.int8) # -1 marks an empty slot
+		self.flags = np.zeros(entries, dtype=np.int8)
+		self.moves = np.zeros(entries, dtype=np.int8)
+
+	def __len__(self):
+		return len(self.keys)
+
+	def probe(self, key):
+		'''
+		Return (depth, flag, value, move) stored for key, or None if it is not in the table
+		'''
+		i = key & self.mask
+		if self.depths[i] < 0 or self.keys[i] != key:
+			return None
+		return int(self.depths[i]), int(self.flags[i]), float(self.values[i]), int(self.moves[i])
+
+	def store(self, key, depth, flag, value, move):
+		i = key & self.mask
+		if self.replace == 'depth' and self.depths[i] > depth and self.keys[i] != key:
+			return
+
+		# Invalidate the slot first and write its depth last, so a search thread that is
+		# killed part way through a store never leaves a half-written entry behind
+		self.depths[i] = -1
+		self.keys[i] = key
+		self.values[i] = value
+		self.flags[i] = flag
+		self.moves[i] = move
+		self.depths[i] = min(depth, 127)
+
+	def clear(self):
+		self.depths[:] = -1